@@ -0,0 +1,68 @@
+"""
+Compares decoding a page of datasets into full resources (the default `list_datasets` path) against decoding it into
+records (`list_datasets(records=True)`).
+
+Usage: python benchmarks/list_records.py [objects per page] [repetitions]
+"""
+
+import json
+import sys
+import timeit
+import tracemalloc
+
+from databasin.datasets import DatasetListResource, DatasetRecordListResource
+from databasin.utils import build_resource
+
+URL = 'https://databasin.org/api/v1/datasets/'
+
+
+def make_page(size):
+    return json.dumps({
+        'meta': {'next': None, 'total_count': size, 'limit': size, 'offset': 0},
+        'objects': [{
+            'id': 'a1b2c{}'.format(i),
+            'owner_id': 'user',
+            'private': False,
+            'title': 'Some Dataset {}'.format(i),
+            'snippet': 'This dataset is...',
+            'create_date': '2015-11-17T22:42:06+00:00',
+            'modify_date': '2015-11-17T22:42:06+00:00',
+            'native': True,
+            'tags': ['one', 'two'],
+            'credits': None,
+            'file_size': 1024,
+            'is_aggregate': False,
+            'version': 1
+        } for i in range(size)]
+    })
+
+
+def decode(resource_class, page):
+    return build_resource(resource_class, json.loads(page), url=URL).objects
+
+
+def measure(resource_class, page, repetitions):
+    seconds = min(timeit.repeat(lambda: decode(resource_class, page), number=repetitions, repeat=3)) / repetitions
+
+    tracemalloc.start()
+    objects = decode(resource_class, page)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+
+    return seconds, memory
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    page = make_page(size)
+
+    print('{0} objects per page, best of 3 x {1} repetitions'.format(size, repetitions))
+    for label, resource_class in (('resources', DatasetListResource), ('records', DatasetRecordListResource)):
+        seconds, memory = measure(resource_class, page, repetitions)
+        print('{0:>10}: {1:8.2f} ms/page {2:10.1f} KiB/page'.format(label, seconds * 1000, memory / 1024.))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import threading
+
+from requests.adapters import HTTPAdapter
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Headers of a 304 response that describe its own (empty) body rather than the cached representation
+NOT_MODIFIED_ENTITY_HEADERS = {'content-length', 'content-encoding', 'content-type', 'transfer-encoding'}
+
+
+class RefererHTTPAdapter(HTTPAdapter):
+    """
+    Adds the `Referer` and CSRF headers Data Basin requires. Takes the same arguments as `HTTPAdapter`, and
+    `keep_alive`: if `False`, connections are closed after each request instead of being returned to the pool.
+    `rate_limiter`: a `databasin.ratelimit.RateLimiter` to hold requests to, and retry throttled requests with.
+    `retry_policy`: a `databasin.retry.RetryPolicy` for retrying failed requests.
+
+    Adapters can be pickled, and can be used in a child process after a fork.
+    """
+
+    __attrs__ = HTTPAdapter.__attrs__ + ['keep_alive', 'rate_limiter', 'retry_policy']
+
+    def __init__(self, *args, **kwargs):
+        self.keep_alive = kwargs.pop('keep_alive', True)
+        self.rate_limiter = kwargs.pop('rate_limiter', None)
+        self.retry_policy = kwargs.pop('retry_policy', None)
+        self._pid = os.getpid()
+
+        super(RefererHTTPAdapter, self).__init__(*args, **kwargs)
+
+    def __setstate__(self, state):
+        super(RefererHTTPAdapter, self).__setstate__(state)
+
+        self._pid = os.getpid()
+
+    def reset_after_fork(self):
+        """
+        Replaces the connection pools inherited from the parent process, whose sockets are shared with it, and the
+        locks and in-flight counts of the rate limiter and retry policy, which may be held by the parent's threads.
+        """
+
+        self._pid = os.getpid()
+        self.proxy_manager = {}
+        self.init_poolmanager(self._pool_connections, self._pool_maxsize, block=self._pool_block)
+
+        if self.rate_limiter is not None:
+            self.rate_limiter._init_state()
+        if self.retry_policy is not None:
+            self.retry_policy._init_state()
+
+    def send(self, request, **kwargs):
+        if self._pid != os.getpid():
+            self.reset_after_fork()
+
+        policy = self.retry_policy
+        if policy is None:
+            return self._send_limited(request, **kwargs)
+
+        policy.record_request()
+        attempt = 0
+
+        while True:
+            try:
+                response = self._send_limited(request, **kwargs)
+            except Exception as e:
+                if not policy.should_retry(request, attempt, error=e):
+                    raise
+                policy.sleep(attempt)
+            else:
+                if not policy.should_retry(request, attempt, response=response):
+                    return response
+
+                response.close()
+                policy.sleep(attempt, response)
+
+            attempt += 1
+
+    def _send_limited(self, request, **kwargs):
+        limiter = self.rate_limiter
+        if limiter is None:
+            return super(RefererHTTPAdapter, self).send(request, **kwargs)
+
+        attempts = 0
+        while True:
+            with limiter.limit(request.url):
+                response = super(RefererHTTPAdapter, self).send(request, **kwargs)
+
+            delay = limiter.get_throttle_delay(response)
+            if delay is None or attempts >= limiter.max_retries:
+                return response
+
+            # Release the connection before waiting to retry
+            response.close()
+            limiter.pause(request.url, delay)
+            attempts += 1
+
+    def add_headers(self, request, **kwargs):
+        request.headers['Referer'] = request.url
+
+        if not self.keep_alive:
+            request.headers['Connection'] = 'close'
+
+        if request.method.lower() not in {'get', 'head'} and 'csrftoken' in request._cookies:
+            request.headers['X-CSRFToken'] = request._cookies['csrftoken']
+
+
+class CachingHTTPAdapter(RefererHTTPAdapter):
+    """
+    Caches GET responses that carry an `ETag` or `Last-Modified` validator in `cache` (see `databasin.cache`). Later
+    requests for the same URL are made conditional, and a `304 Not Modified` response is answered from the cache.
+    """
+
+    __attrs__ = RefererHTTPAdapter.__attrs__ + ['cache']
+
+    def __init__(self, cache, *args, **kwargs):
+        super(CachingHTTPAdapter, self).__init__(*args, **kwargs)
+
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def __setstate__(self, state):
+        super(CachingHTTPAdapter, self).__setstate__(state)
+
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def reset_after_fork(self):
+        super(CachingHTTPAdapter, self).reset_after_fork()
+
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+    def get_cache_key(self, request):
+        # Responses depend on who is asking, so the key includes the API user and session cookie along with the URL
+        identity = '{0}\n{1}'.format(request.headers.get('x-api-user', ''), request.headers.get('Cookie', ''))
+        return '{0} {1} {2}'.format(request.method, request.url, hashlib.sha1(identity.encode()).hexdigest())
+
+    def send(self, request, **kwargs):
+        if request.method.upper() != 'GET':
+            return super(CachingHTTPAdapter, self).send(request, **kwargs)
+
+        key = self.get_cache_key(request)
+        entry = self.cache.get(key)
+
+        if entry is not None:
+            # Entries store headers as a plain dict, so they can be serialized
+            cached_headers = CaseInsensitiveDict(entry['headers'])
+            if cached_headers.get('ETag'):
+                request.headers['If-None-Match'] = cached_headers['ETag']
+            if cached_headers.get('Last-Modified'):
+                request.headers['If-Modified-Since'] = cached_headers['Last-Modified']
+
+        response = super(CachingHTTPAdapter, self).send(request, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                self.hits += 1
+            return self.build_cached_response(request, response, entry)
+
+        with self._lock:
+            self.misses += 1
+
+        if response.status_code == 200 and not kwargs.get('stream'):
+            if response.headers.get('ETag') or response.headers.get('Last-Modified'):
+                self.cache.set(key, {
+                    'status': response.status_code,
+                    'reason': response.reason,
+                    'headers': dict(response.headers),
+                    'content': response.content
+                })
+
+        return response
+
+    def build_cached_response(self, request, not_modified, entry):
+        # Release the connection used by the 304 response
+        not_modified.content
+
+        response = Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.headers.update({
+            k: v for k, v in not_modified.headers.items() if k.lower() not in NOT_MODIFIED_ENTITY_HEADERS
+        })
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.raw = not_modified.raw
+        response._content = entry['content']
+        response._content_consumed = True
+
+        return response
@@ -0,0 +1,376 @@
+import asyncio
+import json
+import os
+import time
+
+import six
+from requests import Session
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from restle.exceptions import HTTPException, NotFoundException
+from six import text_type
+
+import databasin
+from databasin.client import (
+    DATASET_DETAIL_PATH, DATASET_IMPORT_DETAIL_PATH, DATASET_IMPORT_LIST_PATH, DATASET_LIST_PATH, DEFAULT_HOST,
+    JOB_CREATE_PATH, JOB_DETAIL_PATH, LOGIN_PATH, METADATA_FILE_UPLOAD_PATH, TEMPORARY_FILE_LIST_PATH,
+    TEMPORARY_FILE_UPLOAD_PATH, build_netcdf_archive, open_lpk, parse_import_job, sign_api_key
+)
+from databasin.datasets import DatasetResource, DatasetListResource, DatasetImportListResource, DatasetImportResource
+from databasin.exceptions import LoginError, DatasetImportError
+from databasin.jobs import JOB_ACTIVE_STATUSES, AdaptivePoll, JobResource, get_remaining_interval
+from databasin.uploads import TemporaryFileResource, TEMPORARY_FILE_DETAIL_PATH, TemporaryFileListResource
+from databasin.utils import build_resource, raise_for_authorization
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# IDE inspection trips over these as imports
+urljoin = six.moves.urllib_parse.urljoin
+urlencode = six.moves.urllib_parse.urlencode
+urlparse = six.moves.urllib_parse.urlparse
+
+
+async def empty_iterator():
+    return
+    yield
+
+
+class AsyncClient(object):
+    """
+    An asyncio version of `databasin.client.Client`, built on `aiohttp`.
+
+    Resources returned by this client are fully loaded and read-only as far as the event loop is concerned: their
+    own methods (e.g., `DatasetResource.make_public`) are blocking and are not authenticated by this client.
+    """
+
+    def __init__(self, host=DEFAULT_HOST, user=None, api_key=None, connection_limit=100):
+        if aiohttp is None:
+            raise ImportError('AsyncClient requires aiohttp (install python-databasin[aio])')
+
+        self._session = None
+        self._resource_session = Session()
+        self.connection_limit = connection_limit
+
+        self.base_url = 'https://{}'.format(host)
+        self.username = None
+
+        self.api_key = None
+        self.set_api_key(user, api_key)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def get_session(self):
+        """Returns the `aiohttp.ClientSession` for this client, creating it if necessary (requires a running loop)"""
+
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connection_limit),
+                headers={'user-agent': 'python-databasin/{}'.format(databasin.__version__)}
+            )
+
+        return self._session
+
+    def get_headers(self, method, url):
+        headers = {'Referer': url}
+
+        if self.api_key is not None:
+            headers.update({
+                k: v.decode() if isinstance(v, bytes) else v
+                for k, v in six.iteritems(sign_api_key(self.username, self.api_key))
+            })
+
+        csrftoken = self.get_cookie('csrftoken')
+        if method.lower() not in {'get', 'head'} and csrftoken is not None:
+            headers['X-CSRFToken'] = csrftoken
+
+        return headers
+
+    def get_cookie(self, name):
+        for cookie in self.get_session().cookie_jar:
+            if cookie.key == name:
+                return cookie.value
+
+        return None
+
+    def build_url(self, path):
+        return urljoin(self.base_url, path)
+
+    async def request(self, method, url, **kwargs):
+        """Makes a request and returns it as a (fully read) `requests.Response`, so that it can be handled the same
+        way as responses to the blocking client."""
+
+        headers = self.get_headers(method, url)
+        headers.update(kwargs.pop('headers', {}))
+
+        async with self.get_session().request(method, url, headers=headers, **kwargs) as r:
+            response = Response()
+            response.status_code = r.status
+            response.reason = r.reason
+            response.headers = CaseInsensitiveDict(r.headers)
+            response.url = str(r.url)
+            response._content = await r.read()
+            response.encoding = r.charset
+
+            # Also expose cookies set by this response, in the same place `requests` would
+            for name, morsel in six.iteritems(r.cookies):
+                response.cookies.set(name, morsel.value)
+
+        return response
+
+    async def get(self, url, **kwargs):
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    async def get_resource(self, resource_class, url):
+        r = await self.get(url)
+
+        if r.status_code == 404:
+            raise NotFoundException('Server returned 404 Not Found for the URL {0}'.format(url))
+        elif not 200 <= r.status_code < 400:
+            raise_for_authorization(r, self.username is not None)
+            raise HTTPException('Server returned {0} ({1})'.format(r.status_code, r.reason), r)
+
+        return build_resource(resource_class, r.json(), url=url, session=self._resource_session)
+
+    async def paginate(self, list_resource_class, url):
+        """Asynchronously iterates over all objects in a list resource, following `meta.next` links"""
+
+        loaded_urls = set()
+
+        while True:
+            resource = await self.get_resource(list_resource_class, url)
+            for obj in resource.objects:
+                yield obj
+
+            if not resource.meta.next:
+                break
+
+            o = urlparse(url)
+            url = '{0}://{1}{2}'.format(o.scheme, o.netloc, resource.meta.next)
+            if url.lower() in loaded_urls:
+                break
+            loaded_urls.add(url.lower())
+
+    async def login(self, username, password):
+        # Make a get request first to get the CSRF token cookie
+        r = await self.get(self.build_url('/'))
+        r.raise_for_status()
+
+        r = await self.post(self.build_url(LOGIN_PATH), data={
+            'username': username,
+            'password': password,
+            'csrfmiddlewaretoken': self.get_cookie('csrftoken')
+        }, allow_redirects=False)
+        r.raise_for_status()
+
+        if not 'sessionid' in r.cookies:
+            raise LoginError
+
+        self.username = username
+
+    def set_api_key(self, username, api_key):
+        if username is None and api_key is not None:
+            raise ValueError('A user is required with API keys')
+
+        if isinstance(api_key, text_type):
+            api_key = api_key.encode()
+
+        self.username = username
+        self.api_key = api_key
+
+    def list_datasets(self, filters={}, items_per_page=100):
+        """Returns an async iterator over datasets matching `filters`"""
+
+        filters = dict(filters, limit=items_per_page)
+        url = '{0}?{1}'.format(self.build_url(DATASET_LIST_PATH), urlencode(filters))
+
+        return self.paginate(DatasetListResource, url)
+
+    def list_my_datasets(self, **kwargs):
+        if not self.username:
+            return empty_iterator()
+
+        kwargs['filters'] = dict(kwargs.get('filters', {}), owner_id=self.username)
+        return self.list_datasets(**kwargs)
+
+    async def get_dataset(self, dataset_id):
+        return await self.get_resource(DatasetResource, self.build_url(DATASET_DETAIL_PATH.format(id=dataset_id)))
+
+    def list_imports(self, filters={}):
+        url = self.build_url(DATASET_IMPORT_LIST_PATH)
+        if filters:
+            url += '?{0}'.format(urlencode(filters))
+
+        return self.paginate(DatasetImportListResource, url)
+
+    async def get_import(self, import_id):
+        return await self.get_resource(
+            DatasetImportResource, self.build_url(DATASET_IMPORT_DETAIL_PATH.format(id=import_id))
+        )
+
+    async def cancel_import(self, dataset_import):
+        r = await self.request('DELETE', dataset_import._url)
+        raise_for_authorization(r, self.username is not None)
+        r.raise_for_status()
+
+    async def create_job(self, name, job_args={}, block=False):
+        url = self.build_url(JOB_CREATE_PATH)
+
+        r = await self.post(url, json={'job_name': name, 'job_args': job_args})
+        raise_for_authorization(r, self.username is not None)
+        r.raise_for_status()
+
+        location = r.headers['Location']
+        if not urlparse(location).scheme:
+            location = self.build_url(urlparse(location).path)
+
+        job = await self.get_resource(JobResource, location)
+        if block:
+            await self.join_job(job)
+
+        return job
+
+    async def get_job(self, job_id):
+        return await self.get_resource(JobResource, self.build_url(JOB_DETAIL_PATH.format(id=job_id)))
+
+    async def refresh_job(self, job):
+        refreshed = await self.get_resource(JobResource, job._url)
+        for attr in ('status', 'progress', 'message'):
+            setattr(job, attr, getattr(refreshed, attr))
+
+    async def join_job(self, job, timeout=None, poll=1):
+        """Wait until the job is complete. Arguments are as for `JobResource.join`."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        schedule = AdaptivePoll() if poll == 'adaptive' else None
+
+        while job.status in JOB_ACTIVE_STATUSES:
+            interval = poll if schedule is None else schedule.next_interval(job)
+            if deadline is not None:
+                interval = get_remaining_interval(job, deadline, interval)
+
+            await asyncio.sleep(interval)
+            await self.refresh_job(job)
+
+    async def upload_temporary_file(self, f, filename=None):
+        should_close = False
+
+        if isinstance(f, six.string_types):
+            if not filename:
+                filename = os.path.basename(f)
+
+            f = await asyncio.get_running_loop().run_in_executor(None, open, f, 'rb')
+            should_close = True
+
+        try:
+            if self.get_cookie('csrftoken') is None:
+                await self.get(self.build_url('/'))
+
+            data = aiohttp.FormData()
+            data.add_field('csrfmiddlewaretoken', self.get_cookie('csrftoken') or '')
+            data.add_field('file', f, filename=filename or 'file')
+
+            r = await self.post(self.build_url(TEMPORARY_FILE_UPLOAD_PATH), data=data)
+            raise_for_authorization(r, self.username is not None)
+            r.raise_for_status()
+        finally:
+            if should_close:
+                f.close()
+
+        return await self.get_resource(
+            TemporaryFileResource, self.build_url(TEMPORARY_FILE_DETAIL_PATH.format(uuid=r.json()['uuid']))
+        )
+
+    def list_temporary_files(self):
+        return self.paginate(TemporaryFileListResource, self.build_url(TEMPORARY_FILE_LIST_PATH))
+
+    async def get_temporary_file(self, uuid):
+        return await self.get_resource(
+            TemporaryFileResource, self.build_url(TEMPORARY_FILE_DETAIL_PATH.format(uuid=uuid))
+        )
+
+    async def import_lpk(self, lpk_file, xml=None):
+        # File I/O runs in the default executor, so it doesn't hold up other requests on the event loop
+        loop = asyncio.get_running_loop()
+        f, filename = await loop.run_in_executor(None, open_lpk, lpk_file)
+
+        try:
+            tmp_file = await self.upload_temporary_file(f, filename=filename)
+        finally:
+            f.close()
+
+        job_args = {
+            'file': tmp_file.uuid,
+            'url': None,
+            'dataset_type': 'ArcGIS_Native'
+        }
+
+        job = await self.create_job('create_import_job', job_args=job_args, block=True)
+        import_id = json.loads(job.message)['next_uri'].strip('/').split('/')[-2]
+
+        if xml is not None:
+            with await loop.run_in_executor(None, open, xml, 'rb') as f:
+                data = aiohttp.FormData({'layerOrderArray': '0', 'source': ''})
+                data.add_field('data', f, filename=os.path.basename(xml))
+                r = await self.post(self.build_url(METADATA_FILE_UPLOAD_PATH.format(id=import_id)), data=data)
+                r.raise_for_status()
+
+        final_job = await self.create_job('finalize_import_job', job_args={'import_id': import_id}, block=True)
+
+        if final_job.status != 'succeeded':
+            raise DatasetImportError('Import failed: {0}'.format(final_job.message))
+
+        dataset_id, dataset_import_id = parse_import_job(final_job)
+        if dataset_import_id is not None:
+            await self.cancel_import(await self.get_import(dataset_import_id))
+
+            raise DatasetImportError(
+                'Layer Package imports must have all necessary metadata information necessary for one-step import.'
+            )
+
+        return await self.get_dataset(dataset_id)
+
+    async def import_netcdf_dataset(self, nc_or_zip_file, style=None):
+        # Building the archive compresses the whole file, so keep it off the event loop
+        f, filename = await asyncio.get_running_loop().run_in_executor(
+            None, build_netcdf_archive, nc_or_zip_file, style
+        )
+
+        try:
+            tmp_file = await self.upload_temporary_file(f, filename=filename)
+        finally:
+            f.close()
+
+        job_args = {
+            'file': tmp_file.uuid,
+            'url': None,
+            'dataset_type': 'NetCDF_Native'
+        }
+        job = await self.create_job('create_import_job', job_args=job_args, block=True)
+
+        if job.status != 'succeeded':
+            raise DatasetImportError('Import failed: {0}'.format(job.message))
+
+        dataset_id, dataset_import_id = parse_import_job(job)
+        if dataset_import_id is not None:
+            await self.cancel_import(await self.get_import(dataset_import_id))
+
+            raise DatasetImportError(
+                'NetCDF imports must have all necessary style and metadata information necessary for one-step import.'
+            )
+
+        return await self.get_dataset(dataset_id)
@@ -0,0 +1,145 @@
+import base64
+import collections
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class MemoryCache(object):
+    """
+    Stores cached responses in memory. If `maxsize` is given, the least recently used entries are evicted. A pickled
+    cache is restored empty.
+    """
+
+    def __init__(self, maxsize=None):
+        self.maxsize = maxsize
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'maxsize': self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+                return self._data[key]
+            except KeyError:
+                return None
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            if self.maxsize is not None:
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TTLCache(object):
+    """
+    An in-process object cache holding at most `maxsize` entries, each for at most `ttl` seconds. The least recently
+    used entries are evicted first. A pickled cache is restored empty.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {'maxsize': self.maxsize, 'ttl': self.ttl}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value, expires = self._data[key]
+            except KeyError:
+                return None
+
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class FileCache(object):
+    """Stores cached responses as files in `directory`, so they can be shared between processes and sessions."""
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def get(self, key):
+        try:
+            with open(self._path(key)) as f:
+                value = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+        value['content'] = base64.b64decode(value['content'])
+        return value
+
+    def set(self, key, value):
+        value = dict(value, content=base64.b64encode(value['content']).decode())
+
+        # Write to a temporary file first, so that readers never see a partially written entry
+        fd, path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(value, f)
+        os.replace(path, self._path(key))
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            os.remove(os.path.join(self.directory, name))
@@ -0,0 +1,222 @@
+import bisect
+import collections
+import operator
+
+import six
+from restle import fields
+
+from databasin.datasets import DatasetRecord, DatasetResource
+from databasin.store import to_payload
+
+# Fields indexed by value. `tags` is indexed by each tag in the list.
+VALUE_INDEX_FIELDS = ('owner_id', 'private', 'native', 'is_aggregate', 'tags')
+
+# Fields indexed by sorted value, for range lookups
+RANGE_INDEX_FIELDS = ('file_size',)
+
+BOOLEAN_FIELDS = frozenset(f.name for f in DatasetResource._meta.fields if isinstance(f, fields.BooleanField))
+INTEGER_FIELDS = frozenset(f.name for f in DatasetResource._meta.fields if isinstance(f, fields.IntegerField))
+FIELD_NAMES = frozenset(f.name for f in DatasetResource._meta.fields)
+
+RANGE_OPERATORS = {'gt': operator.gt, 'gte': operator.ge, 'lt': operator.lt, 'lte': operator.le}
+
+# Query parameters that control paging and ordering, rather than filter datasets
+RESERVED_PARAMETERS = ('order_by', 'limit', 'offset', 'fields', 'format')
+
+
+def to_python(name, value):
+    """Converts a filter value (which may be a query string value) to the type of field `name`"""
+
+    if name in BOOLEAN_FIELDS and isinstance(value, six.string_types):
+        if value.lower() in ('true', '1'):
+            return True
+        if value.lower() in ('false', '0'):
+            return False
+        raise ValueError("Invalid value for '{0}': {1}".format(name, value))
+
+    if name in INTEGER_FIELDS and value is not None:
+        return int(value)
+
+    return value
+
+
+class LocalCatalog(object):
+    """
+    An in-memory, indexed catalog of dataset metadata (e.g., mirrored with `Client.sync_datasets`), queried with the
+    same filters as `Client.list_datasets`:
+
+        catalog = LocalCatalog.from_store(store)
+        catalog.filter({'owner_id': 'user', 'private': 'false', 'file_size__gte': 1024})
+
+    Exact, `__in`, `__gt`, `__gte`, `__lt` and `__lte` lookups are supported on all fields, and use indexes for
+    `owner_id`, `private`, `native`, `is_aggregate`, `tags` and `file_size`. Datasets are returned as records.
+    """
+
+    def __init__(self, datasets=()):
+        self._records = {}
+        self._values = {name: collections.defaultdict(set) for name in VALUE_INDEX_FIELDS}
+        self._ranges = {name: [] for name in RANGE_INDEX_FIELDS}
+
+        for dataset in datasets:
+            self.add(dataset)
+
+    @classmethod
+    def from_store(cls, store):
+        return cls(store.iter_payloads('datasets'))
+
+    def __len__(self):
+        return len(self._records)
+
+    def __contains__(self, dataset_id):
+        return dataset_id in self._records
+
+    def __iter__(self):
+        return iter(six.itervalues(self._records))
+
+    def get(self, dataset_id):
+        return self._records.get(dataset_id)
+
+    def add(self, dataset):
+        """Adds or replaces a dataset (a payload, resource or record)"""
+
+        if not isinstance(dataset, DatasetRecord):
+            dataset = DatasetRecord(dataset if isinstance(dataset, dict) else to_payload(dataset))
+
+        self.remove(dataset.id)
+        self._records[dataset.id] = dataset
+
+        for name in VALUE_INDEX_FIELDS:
+            for value in self._index_values(name, dataset):
+                self._values[name][value].add(dataset.id)
+
+        for name in RANGE_INDEX_FIELDS:
+            value = getattr(dataset, name)
+            if value is not None:
+                bisect.insort(self._ranges[name], (value, dataset.id))
+
+    def remove(self, dataset_id):
+        dataset = self._records.pop(dataset_id, None)
+        if dataset is None:
+            return
+
+        for name in VALUE_INDEX_FIELDS:
+            for value in self._index_values(name, dataset):
+                ids = self._values[name][value]
+                ids.discard(dataset_id)
+                if not ids:
+                    del self._values[name][value]
+
+        for name in RANGE_INDEX_FIELDS:
+            value = getattr(dataset, name)
+            if value is not None:
+                index = self._ranges[name]
+                del index[bisect.bisect_left(index, (value, dataset_id))]
+
+    def _index_values(self, name, dataset):
+        value = getattr(dataset, name)
+
+        if name == 'tags':
+            return set(value or ())
+
+        return (value,)
+
+    def _lookup(self, name, op, value):
+        """Returns the set of ids matching a lookup using an index, or `None` if there is no suitable index"""
+
+        if name in self._values and op in ('exact', 'in'):
+            index = self._values[name]
+            values = value if op == 'in' else [value]
+            return set().union(*(index.get(to_python(name, v), ()) for v in values))
+
+        if name in self._ranges and op in RANGE_OPERATORS:
+            index = self._ranges[name]
+            value = to_python(name, value)
+
+            # Entries are (value, id) pairs, so search from before the first or after the last id with `value`
+            if op in ('gt', 'lte'):
+                position = bisect.bisect_right(index, (value, u'\uffff'))
+            else:
+                position = bisect.bisect_left(index, (value, u''))
+
+            entries = index[position:] if op in ('gt', 'gte') else index[:position]
+            return {dataset_id for _, dataset_id in entries}
+
+        return None
+
+    def _matches(self, dataset, name, op, value):
+        field_value = getattr(dataset, name)
+
+        if op == 'exact':
+            if name == 'tags':
+                return to_python(name, value) in (field_value or ())
+            return field_value == to_python(name, value)
+
+        if op == 'in':
+            values = {to_python(name, v) for v in value}
+            if name == 'tags':
+                return bool(values.intersection(field_value or ()))
+            return field_value in values
+
+        return field_value is not None and RANGE_OPERATORS[op](field_value, to_python(name, value))
+
+    def _parse_filters(self, filters):
+        lookups = []
+
+        for key, value in six.iteritems(filters):
+            if key in RESERVED_PARAMETERS:
+                continue
+
+            name, _, op = key.partition('__')
+            op = op or 'exact'
+
+            if name not in FIELD_NAMES:
+                raise ValueError('Unknown dataset field: {0}'.format(name))
+            if op != 'exact' and op != 'in' and op not in RANGE_OPERATORS:
+                raise ValueError('Unsupported lookup: {0}'.format(key))
+
+            if op == 'in' and isinstance(value, six.string_types):
+                value = value.split(',')
+
+            lookups.append((name, op, value))
+
+        return lookups
+
+    def filter(self, filters={}):
+        """
+        Returns a list of dataset records matching `filters`, ordered by id. The `order_by` (prefixed with `-` for
+        descending order), `limit` and `offset` parameters are also supported; as with the API, a limit of 0 means no
+        limit.
+        """
+
+        ids = None
+        unindexed = []
+
+        for name, op, value in self._parse_filters(filters):
+            matches = self._lookup(name, op, value)
+            if matches is None:
+                unindexed.append((name, op, value))
+            else:
+                ids = matches if ids is None else ids & matches
+
+        datasets = [self._records[x] for x in sorted(self._records if ids is None else ids)]
+
+        if unindexed:
+            datasets = [x for x in datasets if all(self._matches(x, *lookup) for lookup in unindexed)]
+
+        order_by = filters.get('order_by')
+        if order_by:
+            for key in reversed([order_by] if isinstance(order_by, six.string_types) else order_by):
+                name = key.lstrip('-')
+                if name not in FIELD_NAMES:
+                    raise ValueError('Unknown dataset field: {0}'.format(name))
+
+                # Sort `None` values last in ascending order (and first in descending order), as PostgreSQL does
+                datasets.sort(key=lambda x: (getattr(x, name) is None, getattr(x, name)), reverse=key.startswith('-'))
+
+        offset = int(filters.get('offset', 0))
+        limit = int(filters.get('limit', 0))
+
+        return datasets[offset:offset + limit] if limit else datasets[offset:]
+
+    def count(self, filters={}):
+        return len(self.filter(dict(filters, limit=0, offset=0)))
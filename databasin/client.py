@@ -1,27 +1,43 @@
 import base64
+import collections
+import copy
 import datetime
 import hashlib
 import hmac
 import json
+import logging
 import os
 import random
 import re
 import string
+import threading
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import six
 from dateutil.tz import tzlocal
 from requests import Session
-from requests.adapters import HTTPAdapter
-from restle.exceptions import HTTPException
+from requests.auth import AuthBase
+from restle.exceptions import HTTPException, NotFoundException
 from six import text_type
 
 import databasin
-from databasin.datasets import DatasetResource, DatasetListResource, DatasetImportListResource, DatasetImportResource
-from databasin.exceptions import LoginError, DatasetImportError
+from databasin.adapters import CachingHTTPAdapter, RefererHTTPAdapter
+from databasin.datasets import (
+    DatasetResource, DatasetListResource, DatasetImportListResource, DatasetImportResource,
+    DatasetImportRecordListResource, DatasetRecordListResource, get_dataset_list_resource
+)
+from databasin.exceptions import LoginError, LoginRequiredError, ForbiddenError, DatasetImportError
 from databasin.jobs import JobResource
-from databasin.uploads import TemporaryFileResource, TEMPORARY_FILE_DETAIL_PATH, TemporaryFileListResource
-from databasin.utils import ResourcePaginator, raise_for_authorization
+from databasin.uploads import (
+    TemporaryFileResource, TEMPORARY_FILE_DETAIL_PATH, TemporaryFileListResource, TemporaryFileRecordListResource
+)
+from databasin.utils import (
+    BatchResult, ResourcePaginator, SingleFlight, build_resource, chunk_ids, map_batch, map_concurrently,
+    raise_for_authorization
+)
+
+logger = logging.getLogger(__name__)
 
 # IDE inspection trips over these as imports
 urljoin = six.moves.urllib_parse.urljoin
@@ -39,24 +55,173 @@ TEMPORARY_FILE_LIST_PATH = '/api/v1/uploads/temporary-files/'
 TEMPORARY_FILE_UPLOAD_PATH = '/uploads/upload-temporary-file/'
 METADATA_FILE_UPLOAD_PATH = '/datasets/{id}/import/metadata/'
 
+# Batched list requests are split to keep URLs within this length, which common servers and proxies accept
+MAX_URL_LENGTH = 2000
+
+# Error statuses that are cached by `Client(negative_cache=...)`. Server errors and throttling are transient.
+NEGATIVE_CACHE_STATUS_CODES = {400, 401, 403, 404, 410}
+
+# Store state key for the `modify_date` watermark of `Client.sync_datasets`
+SYNC_DATASETS_KEY = 'datasets.modify_date'
+
 DATASET_IMPORT_ID_RE = re.compile(r'\/import\/([^\/]*)\/')
 
 
-class RefererHTTPAdapter(HTTPAdapter):
-    def add_headers(self, request, **kwargs):
-        request.headers['Referer'] = request.url
+def sign_api_key(username, api_key):
+    """Returns the headers used to authenticate a single request with an API key"""
+
+    date = datetime.datetime.now(tzlocal()).isoformat().encode()
+    salt = ''.join(random.SystemRandom().choice(string.ascii_letters) for _ in range(10)).encode()
 
-        if request.method.lower() not in {'get', 'head'} and 'csrftoken' in request._cookies:
-            request.headers['X-CSRFToken'] = request._cookies['csrftoken']
+    return {
+        'x-api-user': username,
+        'x-api-time': date,
+        'x-api-signature': b':'.join((salt, base64.urlsafe_b64encode(
+            hmac.new(hashlib.sha1(salt + api_key).digest(), msg=date, digestmod=hashlib.sha1).digest()
+        )))
+    }
+
+
+class ApiKeyAuth(AuthBase):
+    """
+    Signs each request with an API key. Signatures are added to the request rather than to the session's headers, so
+    a session using this can be shared between threads.
+    """
+
+    def __init__(self, username, api_key):
+        self.username = username
+        self.api_key = api_key
+
+    def __call__(self, request):
+        request.headers.update(sign_api_key(self.username, self.api_key))
+        return request
+
+
+def open_lpk(lpk_file):
+    """Opens a layer package for upload, returning the file and its filename"""
+
+    if lpk_file.endswith('.lpk') or lpk_file.endswith('.lpkx'):
+        return open(lpk_file, 'rb'), os.path.basename(lpk_file)
+
+    raise ValueError('File must be an ArcGIS Layer Package with a .lpk or .lpkx extension')
+
+
+def build_netcdf_archive(nc_or_zip_file, style=None):
+    """
+    Prepares a NetCDF dataset for upload, returning a file containing a zip archive of the dataset (including style
+    information) and the filename to upload it as. The caller is responsible for closing the file.
+    """
+
+    if nc_or_zip_file.endswith('.zip'):
+        f = open(nc_or_zip_file, 'a+b')
+        zf = zipfile.ZipFile(f, 'a')
+    elif nc_or_zip_file.endswith('.nc'):
+        f = six.BytesIO()
+        zf = zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED)
+        zf.write(nc_or_zip_file, os.path.basename(nc_or_zip_file))
+    else:
+        raise ValueError('File must be .nc or .zip')
+
+    try:
+        if style is not None and isinstance(style, six.string_types):
+            style = json.loads(style)
+
+        if style:
+            zf.writestr('style.json', json.dumps(style))
+        elif not any(name.endswith('style.json') for name in zf.namelist()):
+            raise ValueError(
+                'Import must include style information (either in the zip archive or passed in as an argument)'
+            )
+
+        zf.close()
+        f.seek(0)
+    except Exception:
+        zf.close()
+        f.close()
+        raise
+
+    return f, '{0}.zip'.format(os.path.splitext(os.path.basename(nc_or_zip_file))[0])
+
+
+def parse_import_job(job):
+    """
+    Returns a `(dataset_id, dataset_import_id)` tuple from a completed import job. Only one of these will be set,
+    depending on whether the import completed in one step or still requires more information.
+    """
+
+    next_uri = json.loads(job.message)['next_uri']
+    if '/import/' in next_uri:
+        return None, DATASET_IMPORT_ID_RE.search(next_uri).group(1)
+
+    return next_uri.strip('/').split('/')[-1], None
+
+
+def is_negative_response(error):
+    """Returns `True` if a fetch error is definitive (e.g., not found or forbidden), rather than transient"""
+
+    if isinstance(error, (LoginRequiredError, ForbiddenError, NotFoundException)):
+        return True
+
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code in NEGATIVE_CACHE_STATUS_CODES
 
 
 class Client(object):
-    def __init__(self, host=DEFAULT_HOST, user=None, api_key=None):
-        self._session = Session()
-        self._session.client = self
-        self._session.headers = {'user-agent': 'python-databasin/{}'.format(databasin.__version__)}
-        self._session.mount('https://', RefererHTTPAdapter())
-        self._session.mount('http://', RefererHTTPAdapter())
+    def __init__(self, host=DEFAULT_HOST, user=None, api_key=None, cache=None, dataset_cache=None, store=None,
+                 coalesce=False, negative_cache=None, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 keep_alive=True, rate_limiter=None, retry_policy=None, adapter=None):
+        """
+        :param cache: A cache backend (see `databasin.cache`). If given, GET responses with validators are stored in
+        it and revalidated with conditional requests. Hit and miss counts are available from `adapter.stats`.
+        :param dataset_cache: A `databasin.cache.TTLCache`. If given, `get_dataset` returns datasets from it by id.
+        Entries are invalidated when datasets are modified through this client, and cleared when logging in or
+        changing API keys.
+        :param store: A `databasin.store.MetadataStore`. If given, `get_dataset` and `get_import` return objects from
+        it, revalidating stale entries in the background, and datasets and imports loaded by this client are saved
+        to it. A store should only be shared by clients of the same user.
+        :param coalesce: If `True`, concurrent requests for the same object (e.g., from several threads calling
+        `get_dataset` with the same id) share a single request and its result. The number of requests saved is
+        available from `single_flight.stats`.
+        :param negative_cache: A `databasin.cache.TTLCache`, usually with a short `ttl`. If given, objects that were
+        not found, or that the current user may not access, raise the same error again without a request to the
+        server until the entry expires. The cache is cleared when logging in or changing API keys.
+        :param int pool_connections: The number of hosts to keep connection pools for.
+        :param int pool_maxsize: The maximum number of connections kept open to each host. This should be at least the
+        number of threads sharing the client.
+        :param bool pool_block: If `True`, requests wait for a free connection when `pool_maxsize` connections are in
+        use, rather than opening (and then discarding) extra connections.
+        :param bool keep_alive: If `False`, connections are closed after each request.
+        :param rate_limiter: A `databasin.ratelimit.RateLimiter`, which limits the rate and concurrency of requests per
+        endpoint family, and retries throttled requests after the delay given by the server.
+        :param retry_policy: A `databasin.retry.RetryPolicy`. If given, idempotent requests that fail with connection
+        errors or transient server errors are retried with exponential backoff. Counts are available from its `stats`.
+        :param adapter: A transport adapter (e.g., `client.adapter` of another client) to use instead of creating one,
+        so that several clients share its connection pool. `cache` and the pool options are ignored.
+        """
+
+        self.dataset_cache = dataset_cache
+        self.store = store
+        self.coalesce = coalesce
+        self.negative_cache = negative_cache
+        self._init_process_state()
+
+        if adapter is None:
+            pool_options = {
+                'pool_connections': pool_connections,
+                'pool_maxsize': pool_maxsize,
+                'pool_block': pool_block,
+                'keep_alive': keep_alive,
+                'rate_limiter': rate_limiter,
+                'retry_policy': retry_policy
+            }
+            if cache is not None:
+                adapter = CachingHTTPAdapter(cache, **pool_options)
+            else:
+                adapter = RefererHTTPAdapter(**pool_options)
+
+        self.adapter = adapter
+        self._current_session = None
+        self._cookies = None
 
         self.base_url = 'https://{}'.format(host)
         self.username = None
@@ -64,6 +229,62 @@ class Client(object):
         self.api_key = None
         self.set_api_key(user, api_key)
 
+    def _init_process_state(self):
+        """Sets up the locks, threads and in-flight state that belong to a single process"""
+
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        self._background = None
+        self.single_flight = SingleFlight() if self.coalesce else None
+
+    def __getstate__(self):
+        # Only configuration (and cookies) is pickled; the session is recreated when it's next used
+        state = self.__dict__.copy()
+        session = state.pop('_current_session')
+        if session is not None:
+            state['_cookies'] = session.cookies
+
+        for key in ('_pid', '_lock', '_revalidating', '_background', 'single_flight'):
+            del state[key]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._current_session = None
+        self._init_process_state()
+
+    def _check_process(self):
+        if self._pid != os.getpid():
+            # Threads, locks and in-flight requests of the parent process don't carry over to a forked child. The
+            # adapter replaces its inherited connection pool itself.
+            self._init_process_state()
+
+    @property
+    def _session(self):
+        """The client's session, which is created on first use (e.g., after unpickling)"""
+
+        self._check_process()
+
+        if self._current_session is None:
+            # Other threads may be creating the session too, and only one of them should take the restored cookies
+            with self._lock:
+                if self._current_session is None:
+                    session = Session()
+                    session.client = self
+                    session.headers = {'user-agent': 'python-databasin/{}'.format(databasin.__version__)}
+                    session.mount('https://', self.adapter)
+                    session.mount('http://', self.adapter)
+                    if self._cookies is not None:
+                        session.cookies = self._cookies
+                        self._cookies = None
+
+                    self._current_session = session
+                    self.update_headers()
+
+        return self._current_session
+
     def get(self, *args, **kwargs):
         self.update_headers()
 
@@ -75,25 +296,20 @@ class Client(object):
         return self._session.post(*args, **kwargs)
 
     def update_headers(self):
-        if self.api_key is None:
-            try:
-                del self._session.headers['x-api-user']
-                del self._session.headers['x-api-time']
-                del self._session.headers['x-api-signature']
-            except KeyError:
-                pass
-            return
+        """Keeps the session's `ApiKeyAuth` in sync with `username` and `api_key`"""
 
-        date = datetime.datetime.now(tzlocal()).isoformat().encode()
-        salt = ''.join(random.SystemRandom().choice(string.ascii_letters) for _ in range(10)).encode()
+        session = self._current_session
+        if session is None:
+            # The session is set up when it's created
+            return
 
-        self._session.headers.update({
-            'x-api-user': self.username,
-            'x-api-time': date,
-            'x-api-signature': b':'.join((salt, base64.urlsafe_b64encode(
-                hmac.new(hashlib.sha1(salt + self.api_key).digest(), msg=date, digestmod=hashlib.sha1).digest()
-            )))
-        })
+        if self.api_key is None:
+            if isinstance(session.auth, ApiKeyAuth):
+                session.auth = None
+        elif not isinstance(session.auth, ApiKeyAuth) or (
+            (session.auth.username, session.auth.api_key) != (self.username, self.api_key)
+        ):
+            session.auth = ApiKeyAuth(self.username, self.api_key)
 
     def build_url(self, path):
         return urljoin(self.base_url, path)
@@ -116,6 +332,7 @@ class Client(object):
             raise LoginError
 
         self.username = username
+        self.clear_caches()
 
     def set_api_key(self, username, api_key):
         if username is None and api_key is not None:
@@ -126,14 +343,157 @@ class Client(object):
 
         self.username = username
         self.api_key = api_key
+        self.update_headers()
+        self.clear_caches()
+
+    def clear_caches(self):
+        """Clears cached objects, which may no longer be visible to (or may now be visible to) the current user"""
+
+        if self.dataset_cache is not None:
+            self.dataset_cache.clear()
+        if self.negative_cache is not None:
+            self.negative_cache.clear()
+
+    def _fetch(self, resource_class, url):
+        """Loads a resource from the server, raising `LoginRequiredError` or `ForbiddenError` when appropriate"""
+
+        self._check_process()
+        key = (url, self.username)
+
+        if self.negative_cache is not None:
+            error = self.negative_cache.get(key)
+            if error is not None:
+                # Raise a copy, so that tracebacks don't accumulate on the cached exception
+                raise copy.copy(error)
+
+        try:
+            if self.single_flight is not None:
+                return self.single_flight.do(key, self._fetch_uncoalesced, resource_class, url)
+
+            return self._fetch_uncoalesced(resource_class, url)
+        except (LoginRequiredError, ForbiddenError, NotFoundException, HTTPException) as e:
+            if self.negative_cache is not None and is_negative_response(e):
+                self.negative_cache.set(key, e)
+            raise
+
+    def _fetch_uncoalesced(self, resource_class, url):
+        self.update_headers()
+
+        try:
+            return resource_class.get(url, session=self._session, lazy=False)
+        except HTTPException as e:
+            raise_for_authorization(e.response, self.username is not None)
+            raise
+
+    def _get_stored(self, resource_class, url, kind, object_id):
+        """Returns a resource from the store if possible, otherwise from the server (saving it to the store)"""
+
+        return self._get_stored_with_staleness(resource_class, url, kind, object_id)[0]
+
+    def _get_stored_with_staleness(self, resource_class, url, kind, object_id):
+        """Like `_get_stored`, but returns a `(resource, stale)` tuple"""
+
+        if self.store is None:
+            return self._fetch(resource_class, url), False
+
+        self._check_process()
+        stored = self.store.get(kind, object_id)
+        if stored is not None:
+            payload, fetched_at = stored
+            stale = self.store.is_stale(fetched_at)
+            if stale:
+                self._revalidate(resource_class, url, kind, object_id)
+
+            return build_resource(resource_class, payload, url=url, session=self._session), stale
+
+        resource = self._fetch(resource_class, url)
+        self.store.put(kind, resource)
+
+        return resource, False
+
+    def _revalidate(self, resource_class, url, kind, object_id):
+        with self._lock:
+            if (kind, object_id) in self._revalidating:
+                return
+
+            self._revalidating.add((kind, object_id))
+            if self._background is None:
+                self._background = ThreadPoolExecutor(max_workers=2)
+
+        self._background.submit(self._refresh_stored, resource_class, url, kind, object_id)
+
+    def _refresh_stored(self, resource_class, url, kind, object_id):
+        try:
+            self.store.put(kind, self._fetch(resource_class, url))
+        except NotFoundException:
+            self.store.delete(kind, object_id)
+        except Exception:
+            logger.exception('Could not revalidate {0}'.format(url))
+        finally:
+            with self._lock:
+                self._revalidating.discard((kind, object_id))
+
+        if kind == 'datasets' and self.dataset_cache is not None:
+            self.dataset_cache.delete(object_id)
+
+    def _store_pages(self, kind):
+        """Returns a paginator `on_page` callback that saves each page's objects to the store"""
+
+        if self.store is None:
+            return None
+
+        def on_page(page):
+            self.store.put_many(kind, page.objects)
+
+        return on_page
+
+    def paginate(self, resource_class, url, resume_from=None, **kwargs):
+        """
+        Returns a `ResourcePaginator` starting with the page at `url`, or at the position recorded by `resume_from` (a
+        paginator `cursor`). Other arguments are passed to the paginator.
+        """
 
-    def list_datasets(self, filters={}, items_per_page=100):
         self.update_headers()
 
-        filters['limit'] = items_per_page
+        if resume_from is not None:
+            url = resume_from['url']
+
+        return ResourcePaginator(
+            resource_class.get(url, session=self._session, lazy=False), cursor=resume_from, **kwargs
+        )
+
+    def count(self, path, filters={}):
+        """Returns the total number of objects matching `filters` at the list endpoint `path`"""
+
+        # Tastypie treats `limit=0` as "no limit", so a single-object page is the cheapest way to get the total count
+        url = '{0}?{1}'.format(self.build_url(path), urlencode(dict(filters, limit=1)))
+
+        r = self.get(url)
+        raise_for_authorization(r, self.username is not None)
+        r.raise_for_status()
+
+        return r.json()['meta']['total_count']
+
+    def list_datasets(self, filters={}, items_per_page=100, prefetch=0, parallel=0, ordered=True, records=False,
+                      fields=None, resume_from=None):
+        """
+        :param list fields: If given, only these fields are requested from the server, and the datasets returned have
+        only these fields (plus `id`).
+        :param dict resume_from: A `cursor` from an earlier paginator. Iteration continues from that position, using
+        the filters recorded in it; `fields` and `records` should match those of the original call.
+        """
+
+        resource_class = get_dataset_list_resource(fields, records=records)
+
+        filters = dict(filters, limit=items_per_page)
+        if fields:
+            filters['fields'] = ','.join(sorted(set(fields) | {'id'}))
         url = '{0}?{1}'.format(self.build_url(DATASET_LIST_PATH), urlencode(filters))
 
-        return ResourcePaginator(DatasetListResource.get(url, session=self._session, lazy=False))
+        return self.paginate(
+            resource_class, url, resume_from=resume_from, prefetch=prefetch, parallel=parallel, ordered=ordered,
+            on_page=None if fields else self._store_pages('datasets')
+        )
 
     def list_my_datasets(self, **kwargs):
         if not self.username:
@@ -145,36 +505,183 @@ class Client(object):
 
         return self.list_datasets(**kwargs)
 
+    def count_datasets(self, filters={}):
+        return self.count(DATASET_LIST_PATH, filters)
+
+    def count_datasets_batch(self, filter_sets, max_workers=4):
+        """Counts datasets for each of `filter_sets` concurrently, returning the counts in the same order"""
+
+        return map_concurrently(self.count_datasets, filter_sets, max_workers=max_workers)
+
+    def sync_datasets(self, store, since=None, items_per_page=100):
+        """
+        Saves datasets modified since the last sync (or since `since`, a `modify_date` string or datetime) to `store`,
+        and records the latest `modify_date` seen as the starting point for the next sync. Returns the number of
+        datasets saved.
+        """
+
+        if isinstance(since, datetime.datetime):
+            since = since.isoformat()
+        elif since is None:
+            since = store.get_state(SYNC_DATASETS_KEY)
+
+        # Pages are requested by `modify_date` rather than by offset, so that datasets modified during the sync don't
+        # shift others out of view. `seen` holds the ids already saved with a `modify_date` equal to `watermark`.
+        watermark = since
+        seen = None
+        offset = 0
+        synced = 0
+
+        while True:
+            filters = [('order_by', 'modify_date'), ('order_by', 'id'), ('limit', items_per_page)]
+            if watermark:
+                filters.append(('modify_date__gt' if seen is None else 'modify_date__gte', watermark))
+            if offset:
+                filters.append(('offset', offset))
+
+            url = '{0}?{1}'.format(self.build_url(DATASET_LIST_PATH), urlencode(filters))
+            objects = self._fetch(DatasetRecordListResource, url).objects
+
+            new = [x for x in objects if not (seen and x.modify_date == watermark and x.id in seen)]
+            store.put_many('datasets', new)
+            synced += len(new)
+
+            if len(objects) < items_per_page:
+                break
+
+            last = objects[-1].modify_date
+            if last == watermark:
+                # The whole page has the same `modify_date`, so continue through it by offset
+                offset += items_per_page
+                seen = (seen or set()) | {x.id for x in objects}
+            else:
+                offset = 0
+                seen = {x.id for x in objects if x.modify_date == last}
+                watermark = last
+
+        if objects:
+            watermark = max(watermark or '', objects[-1].modify_date)
+        if watermark:
+            store.set_state(SYNC_DATASETS_KEY, watermark)
+
+        return synced
+
     def get_dataset(self, dataset_id):
-        self.update_headers()
+        if self.dataset_cache is not None:
+            dataset = self.dataset_cache.get(dataset_id)
+            if dataset is not None:
+                return dataset
 
-        try:
-            return DatasetResource.get(
-                self.build_url(DATASET_DETAIL_PATH.format(id=dataset_id)), session=self._session, lazy=False
-            )
-        except HTTPException as e:
-            raise_for_authorization(e.response, self.username is not None)
-            raise
+        dataset, stale = self._get_stored_with_staleness(
+            DatasetResource, self.build_url(DATASET_DETAIL_PATH.format(id=dataset_id)), 'datasets', dataset_id
+        )
 
-    def list_imports(self, filters={}):
-        self.update_headers()
+        # A stale copy is being revalidated, which may finish first, so don't keep it in the cache for its full TTL
+        if self.dataset_cache is not None and not stale:
+            self.dataset_cache.set(dataset_id, dataset)
+
+        return dataset
+
+    def get_datasets(self, dataset_ids, max_workers=4, batched=False):
+        """
+        Fetches datasets concurrently, returning a `BatchResult` for each id in the same order as `dataset_ids`. Errors
+        (e.g., `ForbiddenError`) are returned in the `error` slot of their id's result, rather than raised.
 
+        :param batched: If `True`, datasets are fetched with one list request (filtered by `id__in`) per group of ids,
+        rather than one request per id. Groups are sized to keep URLs within `MAX_URL_LENGTH`. Ids that the list
+        doesn't return (because the dataset doesn't exist or isn't visible to the user) get a `NotFoundException`. Ids
+        found in `dataset_cache` aren't requested.
+        """
+
+        if not batched:
+            return map_batch(self.get_dataset, dataset_ids, max_workers=max_workers)
+
+        dataset_ids = list(dataset_ids)
+        list_url = self.build_url(DATASET_LIST_PATH)
+
+        def fetch(ids):
+            url = '{0}?{1}'.format(list_url, urlencode([('id__in', ','.join(ids)), ('limit', len(ids))]))
+            try:
+                return list(self.paginate(DatasetListResource, url))
+            except HTTPException as e:
+                raise_for_authorization(e.response, self.username is not None)
+                raise
+
+        # Ids may be given as any type that `get_dataset` accepts, but the API returns them as strings
+        keys = collections.OrderedDict((dataset_id, six.text_type(dataset_id)) for dataset_id in dataset_ids)
+
+        found = {}
+        if self.dataset_cache is not None:
+            for dataset_id, key in six.iteritems(keys):
+                dataset = self.dataset_cache.get(dataset_id)
+                if dataset is not None:
+                    found[key] = dataset
+
+        # Leave room in the URL for the query string keys and the limit
+        max_length = MAX_URL_LENGTH - len(list_url) - len('?id__in=&limit=0000')
+        missing = list(collections.OrderedDict.fromkeys(key for key in six.itervalues(keys) if key not in found))
+
+        fetched = {}
+        errors = {}
+        for chunk in map_batch(fetch, chunk_ids(missing, max_length), max_workers=max_workers):
+            if chunk.error is not None:
+                errors.update((key, chunk.error) for key in chunk.id)
+            else:
+                fetched.update((dataset.id, dataset) for dataset in chunk.result)
+
+        if self.dataset_cache is not None:
+            for dataset_id, key in six.iteritems(keys):
+                if key in fetched:
+                    self.dataset_cache.set(dataset_id, fetched[key])
+
+        found.update(fetched)
+
+        results = []
+        for dataset_id in dataset_ids:
+            key = keys[dataset_id]
+            if key in found:
+                results.append(BatchResult(dataset_id, found[key], None))
+            else:
+                error = errors.get(key) or NotFoundException('Dataset {0} was not found'.format(dataset_id))
+                results.append(BatchResult(dataset_id, None, error))
+
+        return results
+
+    def invalidate_dataset(self, dataset_id):
+        """Called when a dataset is modified, so that cached copies are not returned"""
+
+        if self.dataset_cache is not None:
+            self.dataset_cache.delete(dataset_id)
+        if self.store is not None:
+            self.store.delete('datasets', dataset_id)
+
+    def list_imports(self, filters={}, prefetch=0, records=False, resume_from=None):
         url = self.build_url(DATASET_IMPORT_LIST_PATH)
         if filters:
             url += '?{0}'.format(urlencode(filters))
+        resource_class = DatasetImportRecordListResource if records else DatasetImportListResource
 
-        return ResourcePaginator(DatasetImportListResource.get(url, session=self._session, lazy=False))
+        return self.paginate(
+            resource_class, url, resume_from=resume_from, prefetch=prefetch, on_page=self._store_pages('imports')
+        )
+
+    def count_imports(self, filters={}):
+        return self.count(DATASET_IMPORT_LIST_PATH, filters)
+
+    def count_imports_batch(self, filter_sets, max_workers=4):
+        """Counts imports for each of `filter_sets` concurrently, returning the counts in the same order"""
+
+        return map_concurrently(self.count_imports, filter_sets, max_workers=max_workers)
 
     def get_import(self, import_id):
-        self.update_headers()
+        return self._get_stored(
+            DatasetImportResource, self.build_url(DATASET_IMPORT_DETAIL_PATH.format(id=import_id)), 'imports', import_id
+        )
 
-        try:
-            return DatasetImportResource.get(
-                self.build_url(DATASET_IMPORT_DETAIL_PATH.format(id=import_id)), session=self._session, lazy=False
-            )
-        except HTTPException as e:
-            raise_for_authorization(e.response, self.username is not None)
-            raise
+    def get_imports(self, import_ids, max_workers=4):
+        """Fetches dataset imports concurrently, returning a `BatchResult` for each id (see `get_datasets`)"""
+
+        return map_batch(self.get_import, import_ids, max_workers=max_workers)
 
     def create_job(self, name, job_args={}, block=False):
         self.update_headers()
@@ -186,15 +693,12 @@ class Client(object):
         return job
 
     def get_job(self, job_id):
-        self.update_headers()
+        return self._fetch(JobResource, self.build_url(JOB_DETAIL_PATH.format(id=job_id)))
 
-        try:
-            return JobResource.get(
-                self.build_url(JOB_DETAIL_PATH.format(id=job_id)), session=self._session, lazy=False
-            )
-        except HTTPException as e:
-            raise_for_authorization(e.response, self.username is not None)
-            raise
+    def get_jobs(self, job_ids, max_workers=4):
+        """Fetches jobs concurrently, returning a `BatchResult` for each id (see `get_datasets`)"""
+
+        return map_batch(self.get_job, job_ids, max_workers=max_workers)
 
     def upload_temporary_file(self, f, filename=None):
         self.update_headers()
@@ -203,45 +707,36 @@ class Client(object):
             self.build_url(TEMPORARY_FILE_UPLOAD_PATH), f, filename=filename, session=self._session
         )
 
-    def list_temporary_files(self):
-        self.update_headers()
+    def list_temporary_files(self, prefetch=0, records=False, resume_from=None):
+        resource_class = TemporaryFileRecordListResource if records else TemporaryFileListResource
 
-        return ResourcePaginator(
-            TemporaryFileListResource.get(self.build_url(TEMPORARY_FILE_LIST_PATH), session=self._session, lazy=False)
+        return self.paginate(
+            resource_class, self.build_url(TEMPORARY_FILE_LIST_PATH), resume_from=resume_from, prefetch=prefetch
         )
 
-    def get_temporary_file(self, uuid):
-        self.update_headers()
+    def count_temporary_files(self):
+        return self.count(TEMPORARY_FILE_LIST_PATH)
 
-        try:
-            return TemporaryFileResource.get(
-                self.build_url(TEMPORARY_FILE_DETAIL_PATH.format(uuid=uuid)), session=self._session, lazy=False
-            )
-        except HTTPException as e:
-            raise_for_authorization(e.response, self.username is not None)
-            raise
+    def get_temporary_file(self, uuid):
+        return self._fetch(TemporaryFileResource, self.build_url(TEMPORARY_FILE_DETAIL_PATH.format(uuid=uuid)))
 
     def import_lpk(self, lpk_file, xml=None):
-        if lpk_file.endswith('.lpk') or lpk_file.endswith('.lpkx'):
-            f = open(lpk_file, 'rb')
-        else:
-            raise ValueError('File must be an ArcGIS Layer Package with a .lpk or .lpkx extension')
-
-        filename = os.path.basename(lpk_file)
-
-        tmp_file = self.upload_temporary_file(f, filename=filename)
+        f, filename = open_lpk(lpk_file)
 
-        f.close()
+        try:
+            tmp_file = self.upload_temporary_file(f, filename=filename)
+        finally:
+            f.close()
 
         job_args = {
             'file': tmp_file.uuid,
             'url': None,
             'dataset_type': 'ArcGIS_Native'
         }
-       
+
         job = self.create_job('create_import_job', job_args=job_args, block=True)
         import_id = json.loads(job.message)['next_uri'].strip('/').split('/')[-2]
-        
+
         final_job_args = {
             'import_id': import_id
         }
@@ -260,10 +755,8 @@ class Client(object):
         if final_job.status != 'succeeded':
             raise DatasetImportError('Import failed: {0}'.format(final_job.message))
 
-        data = json.loads(final_job.message)
-        next_uri = data['next_uri']
-        if '/import/' in next_uri:
-            dataset_import_id = DATASET_IMPORT_ID_RE.search(next_uri).group(1)
+        dataset_id, dataset_import_id = parse_import_job(final_job)
+        if dataset_import_id is not None:
             dataset_import = self.get_import(dataset_import_id)
             dataset_import.cancel()
 
@@ -271,38 +764,33 @@ class Client(object):
                 'Layer Package imports must have all necessary metadata information necessary for one-step import.'
             )
 
-        dataset_id = next_uri.strip('/').split('/')[-1]
         return self.get_dataset(dataset_id)
-    
-    def import_netcdf_dataset(self, nc_or_zip_file, style=None):
-        if nc_or_zip_file.endswith('.zip'):
-            f = open(nc_or_zip_file, 'a+b')
-            zf = zipfile.ZipFile(f, 'a')
-        elif nc_or_zip_file.endswith('.nc'):
-            f = six.BytesIO()
-            zf = zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED)
-            zf.write(nc_or_zip_file, os.path.basename(nc_or_zip_file))
-        else:
-            raise ValueError('File must be .nc or .zip')
 
-        try:
-            if style is not None and isinstance(style, six.string_types):
-                style = json.loads(style)
+    def import_many(self, paths, workers=4, style=None):
+        """
+        Imports layer packages (.lpk or .lpkx) and NetCDF datasets (.nc or .zip) concurrently, returning a `BatchResult`
+        for each path, in the same order as `paths`, with the imported dataset or the error that stopped its import.
+
+        Each file is imported by one of `workers` threads, so the stages of different imports overlap: while one
+        file's archive is built, another can be uploading and others waiting for their import jobs.
+
+        :param style: Style information for NetCDF datasets that don't include it (see `import_netcdf_dataset`).
+        """
 
-            if style:
-                zf.writestr('style.json', json.dumps(style))
-            elif not any(name.endswith('style.json') for name in zf.namelist()):
-                raise ValueError(
-                    'Import must include style information (either in the zip archive or passed in as an argument)'
-                )
+        def import_file(path):
+            if path.endswith('.nc') or path.endswith('.zip'):
+                return self.import_netcdf_dataset(path, style=style)
 
-            zf.close()
-            f.seek(0)
+            return self.import_lpk(path)
 
-            filename = '{0}.zip'.format(os.path.splitext(os.path.basename(nc_or_zip_file))[0])
+        return map_batch(import_file, paths, max_workers=workers)
+
+    def import_netcdf_dataset(self, nc_or_zip_file, style=None):
+        f, filename = build_netcdf_archive(nc_or_zip_file, style)
+
+        try:
             tmp_file = self.upload_temporary_file(f, filename=filename)
         finally:
-            zf.close()
             f.close()
 
         job_args = {
@@ -317,10 +805,8 @@ class Client(object):
 
         # For now, we require imports to have all metadata and style info necessary for one-step import. Later we may
         # add support for multi-stage import, wherein the user could incrementally provide necessary information.
-        data = json.loads(job.message)
-        next_uri = data['next_uri']
-        if '/import/' in next_uri:
-            dataset_import_id = DATASET_IMPORT_ID_RE.search(next_uri).group(1)
+        dataset_id, dataset_import_id = parse_import_job(job)
+        if dataset_import_id is not None:
             dataset_import = self.get_import(dataset_import_id)
             dataset_import.cancel()
 
@@ -328,5 +814,4 @@ class Client(object):
                 'NetCDF imports must have all necessary style and metadata information necessary for one-step import.'
             )
 
-        dataset_id = next_uri.strip('/').split('/')[-1]
         return self.get_dataset(dataset_id)
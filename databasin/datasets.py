@@ -1,7 +1,8 @@
 from restle import fields
 from restle.resources import Resource
 
-from databasin.utils import raise_for_authorization
+from databasin.records import make_record_class, RecordListField
+from databasin.utils import SessionToManyField, project_resource, raise_for_authorization
 
 
 class DatasetResource(Resource):
@@ -37,6 +38,10 @@ class DatasetResource(Resource):
         raise_for_authorization(r, hasattr(self._session, 'client') and self._session.client.username is not None)
         r.raise_for_status()
 
+        self.private = private
+        if hasattr(self._session, 'client'):
+            self._session.client.invalidate_dataset(self.id)
+
     def make_public(self):
         self._set_private(False)
 
@@ -56,7 +61,49 @@ class DatasetResource(Resource):
 
 class DatasetListResource(Resource):
     meta = fields.ObjectField('meta')
-    objects = fields.ToManyField(DatasetResource, nest_type='full', id_field='id', relative_path='{id}/')
+    objects = SessionToManyField(DatasetResource, nest_type='full', id_field='id', relative_path='{id}/')
+
+
+DatasetRecord = make_record_class(DatasetResource)
+
+
+class DatasetRecordListResource(Resource):
+    meta = fields.ObjectField('meta')
+    objects = RecordListField(DatasetRecord)
+
+
+_dataset_list_projections = {}
+
+
+def get_dataset_list_resource(field_names=None, records=False):
+    """
+    Returns the list resource class for datasets. If `field_names` is given, its objects (resources or records) hold
+    only those fields. The `id` field is always included.
+    """
+
+    if not field_names:
+        return DatasetRecordListResource if records else DatasetListResource
+
+    field_names = frozenset(field_names) | {'id'}
+    unknown = field_names - {f.name for f in DatasetResource._meta.fields}
+    if unknown:
+        raise ValueError('Unknown dataset field(s): {0}'.format(', '.join(sorted(unknown))))
+
+    key = (field_names, records)
+    if key not in _dataset_list_projections:
+        if records:
+            objects = RecordListField(make_record_class(DatasetResource, field_names))
+        else:
+            objects = SessionToManyField(
+                project_resource(DatasetResource, field_names), nest_type='full', id_field='id', relative_path='{id}/'
+            )
+
+        _dataset_list_projections[key] = type(
+            DatasetListResource.__name__, (Resource,),
+            {'meta': fields.ObjectField('meta'), 'objects': objects, '__module__': __name__}
+        )
+
+    return _dataset_list_projections[key]
 
 
 class DatasetImportResource(Resource):
@@ -93,4 +140,12 @@ class DatasetImportResource(Resource):
 
 class DatasetImportListResource(Resource):
     meta = fields.ObjectField('meta')
-    objects = fields.ToManyField(DatasetImportResource, nest_type='full')
+    objects = SessionToManyField(DatasetImportResource, nest_type='full')
+
+
+DatasetImportRecord = make_record_class(DatasetImportResource)
+
+
+class DatasetImportRecordListResource(Resource):
+    meta = fields.ObjectField('meta')
+    objects = RecordListField(DatasetImportRecord)
@@ -23,3 +23,11 @@ class DatasetImportError(Exception):
     """Raised in response to an import failure."""
 
     pass
+
+
+class JobTimeoutError(Exception):
+    """Raised when a job doesn't complete before a timeout."""
+
+    def __init__(self, message, job=None):
+        super(JobTimeoutError, self).__init__(message)
+        self.job = job
@@ -1,12 +1,30 @@
-import six
+import logging
+import threading
 import time
+from concurrent.futures import Future
+
+import six
 from requests import Session
+from requests.exceptions import ConnectionError, Timeout
 from restle import fields
+from restle.exceptions import HTTPException, NotFoundException
 from restle.resources import Resource
 
-from databasin.utils import raise_for_authorization
+from databasin.exceptions import JobTimeoutError
+from databasin.utils import SessionToManyField, chunk_ids, raise_for_authorization
+
+logger = logging.getLogger(__name__)
 
 urlparse = six.moves.urllib_parse.urlparse  # IDE inspection trips over this as an import
+urlencode = six.moves.urllib_parse.urlencode
+
+JOB_ACTIVE_STATUSES = {'queued', 'running'}
+
+# Fields updated when a job is refreshed
+JOB_STATUS_FIELDS = ('status', 'progress', 'message')
+
+# Batched status requests are split to keep URLs within this length
+MAX_BATCH_URL_LENGTH = 2000
 
 
 class JobResource(Resource):
@@ -42,9 +60,254 @@ class JobResource(Resource):
         for attr in ('status', 'progress', 'message'):
             setattr(self, attr, getattr(job, attr))
 
-    def join(self):
-        """Block until the job is complete."""
+    def join(self, timeout=None, poll=1):
+        """
+        Block until the job is complete.
+
+        :param timeout: If given, `JobTimeoutError` is raised if the job isn't complete after this many seconds.
+        :param poll: The number of seconds between status checks, or 'adaptive' to check often at first and less often
+        as the job runs (see `AdaptivePoll`).
+        """
 
-        while self.status in {'queued', 'running'}:
-            time.sleep(1)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        schedule = AdaptivePoll() if poll == 'adaptive' else None
+
+        while self.status in JOB_ACTIVE_STATUSES:
+            interval = poll if schedule is None else schedule.next_interval(self)
+            if deadline is not None:
+                interval = get_remaining_interval(self, deadline, interval)
+
+            time.sleep(interval)
             self.refresh()
+
+
+def get_remaining_interval(job, deadline, interval):
+    """Returns `interval`, shortened so as not to pass `deadline`. Raises `JobTimeoutError` once it has passed."""
+
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise JobTimeoutError('Job {0} did not complete in time (status: {1})'.format(job.id, job.status), job=job)
+
+    return min(interval, remaining)
+
+
+class AdaptivePoll(object):
+    """
+    Chooses intervals between job status checks: starting at `initial` seconds and increasing by `factor` after each
+    check, up to `maximum`. Once the job's `progress` has changed, the interval is instead half the estimated time to
+    completion at the average rate of progress so far (within the same bounds).
+    """
+
+    def __init__(self, initial=.25, factor=1.5, maximum=30):
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self._backoff = initial
+        self._start = None
+
+    def next_interval(self, job):
+        now = time.monotonic()
+        interval = self._backoff
+        self._backoff = min(self._backoff * self.factor, self.maximum)
+
+        # Progress is measured from the first check, for a steadier estimate of the rate
+        progress = job.progress or 0
+        if self._start is None:
+            self._start = (progress, now)
+        elif progress > self._start[0] and now > self._start[1]:
+            rate = (progress - self._start[0]) / (now - self._start[1])
+            interval = max(self.initial, min((100 - progress) / rate / 2, self.maximum))
+
+        return interval
+
+
+class JobListResource(Resource):
+    meta = fields.ObjectField('meta')
+    objects = SessionToManyField(JobResource, nest_type='full', id_field='id', relative_path='{id}/')
+
+
+class JobWatcher(object):
+    """
+    Watches any number of jobs from a single polling thread, instead of a thread blocked in `join()` per job:
+
+        with JobWatcher() as watcher:
+            futures = [watcher.watch(job, callback=on_done) for job in jobs]
+            concurrent.futures.wait(futures)
+
+    `watch` returns a future, which resolves to the job (or the error raised while refreshing it) once the job is no
+    longer queued or running. Every `interval` seconds, the statuses of all watched jobs are refreshed. If `batch` is
+    `True`, they're requested from the job list endpoint (filtered by `id__in`) a few requests at a time, falling back
+    to refreshing jobs individually if the endpoint doesn't support this. Connection errors and timeouts are retried on
+    the next poll.
+    """
+
+    def __init__(self, interval=1, batch=True):
+        self.interval = interval
+        self.batch = batch
+        self.requests = 0
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def watch(self, job, callback=None):
+        """
+        Returns a future for `job`. If given, `callback` is called with the job when it completes: from the polling
+        thread, or immediately if the job has already completed.
+
+        The same job may be watched through several objects (e.g., from separate `Client.get_job` calls). It's polled
+        once, and each object is updated with its status.
+        """
+
+        future = Future()
+        if callback is not None:
+            def done(f):
+                if not f.cancelled() and f.exception() is None:
+                    callback(f.result())
+
+            future.add_done_callback(done)
+
+        if job.status not in JOB_ACTIVE_STATUSES:
+            future.set_result(job)
+            return future
+
+        with self._lock:
+            if self._stopped.is_set():
+                raise RuntimeError('The watcher is closed')
+
+            self._jobs.setdefault(job._url, []).append((job, future))
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='JobWatcher')
+                self._thread.daemon = True
+                self._thread.start()
+
+        return future
+
+    def close(self, wait=True):
+        """Stops polling. Futures of jobs still being watched are cancelled."""
+
+        self._stopped.set()
+        if wait and self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+        with self._lock:
+            jobs, self._jobs = self._jobs, {}
+
+        for entries in six.itervalues(jobs):
+            for _, future in entries:
+                future.cancel()
+
+    def _run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                self._poll()
+        except Exception as e:
+            # Don't leave futures pending with no thread to resolve them
+            logger.exception('Job watcher failed')
+
+            with self._lock:
+                self._stopped.set()
+                jobs, self._jobs = self._jobs, {}
+
+            for entries in six.itervalues(jobs):
+                for _, future in entries:
+                    future.set_exception(e)
+
+    def _poll(self):
+        # Only the first object watched for each job is refreshed
+        with self._lock:
+            jobs = [entries[0][0] for entries in six.itervalues(self._jobs)]
+
+        if not jobs:
+            return
+
+        try:
+            refreshed = self._refresh_batches(jobs) if self.batch else set()
+        except (ConnectionError, Timeout):
+            logger.warning('Job list request failed; retrying on the next poll', exc_info=True)
+            return
+
+        for job in jobs:
+            if job._url in refreshed:
+                continue
+
+            try:
+                self.requests += 1
+                job.refresh()
+            except (ConnectionError, Timeout):
+                logger.warning('Job status request failed; retrying on the next poll', exc_info=True)
+            except Exception as e:
+                self._resolve(job, error=e)
+
+        for job in jobs:
+            if job.status not in JOB_ACTIVE_STATUSES:
+                self._resolve(job)
+            else:
+                self._update(job)
+
+    def _refresh_batches(self, jobs):
+        """Refreshes jobs with list requests where possible, returning the URLs of the jobs that were refreshed"""
+
+        groups = {}
+        for job in jobs:
+            list_url = '{0}/'.format(job._url.rstrip('/').rsplit('/', 1)[0])
+            groups.setdefault(list_url, []).append(job)
+
+        refreshed = set()
+
+        for list_url, group in six.iteritems(groups):
+            by_id = {job.id: job for job in group}
+            max_length = MAX_BATCH_URL_LENGTH - len(list_url) - len('?id__in=&limit=0000')
+
+            for ids in chunk_ids(sorted(by_id), max_length):
+                url = '{0}?{1}'.format(list_url, urlencode([('id__in', ','.join(ids)), ('limit', len(ids))]))
+
+                try:
+                    self.requests += 1
+                    page = JobListResource.get(url, session=group[0]._session, lazy=False)
+                except (HTTPException, NotFoundException, ValueError):
+                    logger.info('Job list requests failed; refreshing jobs individually')
+                    self.batch = False
+                    return refreshed
+
+                for listed in page.objects:
+                    job = by_id.get(listed.id)
+                    if job is not None:
+                        for attr in JOB_STATUS_FIELDS:
+                            setattr(job, attr, getattr(listed, attr))
+                        refreshed.add(job._url)
+
+        return refreshed
+
+    def _update(self, job, remove=False):
+        """
+        Copies the status of `job` to the other objects watched for the same job, returning the (object, future)
+        pairs watched for it. If `remove` is `True`, the job is no longer watched.
+        """
+
+        with self._lock:
+            if remove:
+                entries = self._jobs.pop(job._url, [])
+            else:
+                entries = list(self._jobs.get(job._url, []))
+
+        for watched, _ in entries:
+            if watched is not job:
+                for attr in JOB_STATUS_FIELDS:
+                    setattr(watched, attr, getattr(job, attr))
+
+        return entries
+
+    def _resolve(self, job, error=None):
+        for watched, future in self._update(job, remove=True):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(watched)
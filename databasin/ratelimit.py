@@ -0,0 +1,188 @@
+import contextlib
+import datetime
+import email.utils
+import threading
+import time
+
+import six
+
+urlparse = six.moves.urllib_parse.urlparse
+
+# URL path prefixes of each endpoint family, checked in order
+ENDPOINT_FAMILIES = (
+    ('jobs', '/api/v1/jobs/'),
+    ('imports', '/api/v1/dataset_imports/'),
+    ('datasets', '/api/v1/datasets/'),
+    ('uploads', '/api/v1/uploads/'),
+    ('uploads', '/uploads/')
+)
+
+# Responses with these statuses are retried after the delay given by their `Retry-After` header
+THROTTLE_STATUS_CODES = (429, 503)
+
+# The delay before retrying a 429 response without a `Retry-After` header
+DEFAULT_THROTTLE_DELAY = 1
+
+
+def get_endpoint_family(url):
+    path = urlparse(url).path
+
+    for family, prefix in ENDPOINT_FAMILIES:
+        if path.startswith(prefix):
+            return family
+
+    return 'other'
+
+
+def parse_retry_after(value):
+    """Returns the delay in seconds given by a `Retry-After` header (seconds or an HTTP date), or `None`"""
+
+    if not value:
+        return None
+
+    try:
+        return max(float(value), 0)
+    except ValueError:
+        pass
+
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+    now = datetime.datetime.now(date.tzinfo)
+    return max((date - now).total_seconds(), 0)
+
+
+class TokenBucket(object):
+    """Allows `rate` acquisitions per second on average, with bursts of up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(rate, 1)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, returning the time spent waiting"""
+
+        waited = 0
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return waited
+
+                delay = (1 - self._tokens) / self.rate
+
+            time.sleep(delay)
+            waited += delay
+
+
+class _Family(object):
+    def __init__(self, rate=None, burst=None, max_in_flight=None):
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.semaphore = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self.paused_until = 0
+
+
+class RateLimiter(object):
+    """
+    Limits the rate and concurrency of requests made through a client's adapter, per endpoint family ('jobs',
+    'imports', 'datasets', 'uploads' or 'other'):
+
+        RateLimiter(rate=10, max_in_flight=8, families={'jobs': {'rate': 2}})
+
+    `rate` (requests per second, with bursts of up to `burst`) and `max_in_flight` apply to each family without its
+    own settings in `families`. Throttled (429 and 503) responses pause their family for the time given by the
+    `Retry-After` header, and are retried up to `max_retries` times.
+    """
+
+    def __init__(self, rate=None, burst=None, max_in_flight=None, families=None, max_retries=3):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self.families = families or {}
+        self.max_retries = max_retries
+        self._init_state()
+
+    def _init_state(self):
+        self.throttled = 0
+        self.wait_time = 0
+        self._families = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {k: getattr(self, k) for k in ('rate', 'burst', 'max_in_flight', 'families', 'max_retries')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    @property
+    def stats(self):
+        return {'throttled': self.throttled, 'wait_time': self.wait_time}
+
+    def _get_family(self, name):
+        with self._lock:
+            if name not in self._families:
+                options = {'rate': self.rate, 'burst': self.burst, 'max_in_flight': self.max_in_flight}
+                options.update(self.families.get(name, {}))
+                self._families[name] = _Family(**options)
+
+            return self._families[name]
+
+    @contextlib.contextmanager
+    def limit(self, url):
+        """Waits until a request to `url` is allowed, and counts it as in flight for the duration of the block"""
+
+        family = self._get_family(get_endpoint_family(url))
+
+        waited = 0
+        delay = family.paused_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+            waited += delay
+
+        if family.bucket is not None:
+            waited += family.bucket.acquire()
+
+        if family.semaphore is not None:
+            family.semaphore.acquire()
+
+        if waited:
+            with self._lock:
+                self.wait_time += waited
+
+        try:
+            yield
+        finally:
+            if family.semaphore is not None:
+                family.semaphore.release()
+
+    def get_throttle_delay(self, response):
+        """Returns the delay before a throttled response should be retried, or `None` if it wasn't throttled"""
+
+        if response.status_code not in THROTTLE_STATUS_CODES:
+            return None
+
+        delay = parse_retry_after(response.headers.get('Retry-After'))
+        if delay is None and response.status_code == 429:
+            delay = DEFAULT_THROTTLE_DELAY
+
+        return delay
+
+    def pause(self, url, delay):
+        """Holds back requests to the endpoint family of `url` for `delay` seconds"""
+
+        family = self._get_family(get_endpoint_family(url))
+
+        with self._lock:
+            self.throttled += 1
+            family.paused_until = max(family.paused_until, time.monotonic() + delay)
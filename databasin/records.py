@@ -0,0 +1,56 @@
+from restle import fields
+
+
+class Record(object):
+    """
+    A compact, read-only view of a single object in a list response. Records are built directly from decoded JSON,
+    without the field conversion, session and URL bookkeeping of a full resource.
+    """
+
+    __slots__ = ()
+
+    # Tuple of (attribute name, key, default) for each field, set by `make_record_class`
+    _fields = ()
+
+    def __init__(self, data):
+        for attr, key, default in self._fields:
+            setattr(self, attr, data.get(key, default))
+
+    def __repr__(self):
+        return '<{0}: {1}>'.format(self.__class__.__name__, getattr(self, 'id', None))
+
+    def as_dict(self):
+        return {attr: getattr(self, attr) for attr, _, _ in self._fields}
+
+
+def make_record_class(resource_class, field_names=None):
+    """Returns a `Record` class for the fields of `resource_class` (or only those in `field_names`, if given)"""
+
+    fields = tuple(
+        (f._attr_name, f.name, f.default) for f in resource_class._meta.fields
+        if field_names is None or f.name in field_names
+    )
+
+    return type(
+        '{0}Record'.format(resource_class.__name__[:-len('Resource')]),
+        (Record,),
+        {'__slots__': tuple(attr for attr, _, _ in fields), '_fields': fields, '__module__': resource_class.__module__}
+    )
+
+
+class RecordListField(fields.Field):
+    """A list of objects, decoded as `Record` instances instead of nested resources"""
+
+    def __init__(self, record_class, *args, **kwargs):
+        super(RecordListField, self).__init__(*args, **kwargs)
+
+        self.record_class = record_class
+
+    def to_python(self, value, resource):
+        if value is None:
+            return []
+
+        if not isinstance(value, list):
+            raise ValueError("Expected a list of records, got '{0}'".format(value.__class__.__name__))
+
+        return [self.record_class(x) for x in value]
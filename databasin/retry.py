@@ -0,0 +1,96 @@
+import random
+import threading
+import time
+
+from requests.exceptions import ConnectionError, Timeout
+
+from databasin.ratelimit import parse_retry_after
+
+# Methods that can be repeated without changing the result of the first request
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'))
+
+# Statuses that usually mean a request failed for a transient reason
+RETRY_STATUS_CODES = frozenset((500, 502, 503, 504))
+
+
+class RetryPolicy(object):
+    """
+    Retries requests that fail with a connection error, a timeout or a status in `status_codes`, waiting for an
+    exponentially increasing, randomly jittered delay between attempts: up to `backoff_factor * 2 ** attempt` seconds,
+    at most `max_backoff`. A `Retry-After` header sets the minimum delay.
+
+    Only requests with a method in `methods` (idempotent methods by default) are retried, at most `max_retries` times
+    each. So that retries don't add to the load on a failing server, the total number of retries is limited to
+    `min_retries` plus `budget` (a fraction) of the number of requests.
+    """
+
+    def __init__(self, max_retries=3, backoff_factor=.5, max_backoff=30, methods=IDEMPOTENT_METHODS,
+                 status_codes=RETRY_STATUS_CODES, budget=.2, min_retries=10):
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.methods = frozenset(m.upper() for m in methods)
+        self.status_codes = frozenset(status_codes)
+        self.budget = budget
+        self.min_retries = min_retries
+        self._init_state()
+
+    def _init_state(self):
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('requests', 'retries', 'exhausted', '_lock'):
+            del state[key]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_state()
+
+    @property
+    def stats(self):
+        """Counts of requests sent, retries made, and failures not retried because the retry budget was used up"""
+
+        return {'requests': self.requests, 'retries': self.retries, 'exhausted': self.exhausted}
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def should_retry(self, request, attempt, response=None, error=None):
+        """Returns `True` (and counts a retry) if a request that failed on its `attempt`th retry should be retried"""
+
+        if request.method.upper() not in self.methods or attempt >= self.max_retries:
+            return False
+
+        if error is not None:
+            if not isinstance(error, (ConnectionError, Timeout)):
+                return False
+        elif response.status_code not in self.status_codes:
+            return False
+
+        with self._lock:
+            if self.retries >= self.min_retries + self.budget * self.requests:
+                self.exhausted += 1
+                return False
+
+            self.retries += 1
+            return True
+
+    def get_backoff(self, attempt, response=None):
+        delay = random.uniform(0, min(self.max_backoff, self.backoff_factor * 2 ** attempt))
+
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                delay = max(delay, min(retry_after, self.max_backoff))
+
+        return delay
+
+    def sleep(self, attempt, response=None):
+        time.sleep(self.get_backoff(attempt, response))
@@ -0,0 +1,137 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from databasin.records import Record
+
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS objects (
+        kind TEXT NOT NULL,
+        id TEXT NOT NULL,
+        modify_date TEXT,
+        version INTEGER,
+        payload TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        PRIMARY KEY (kind, id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """,
+)
+
+# Don't replace a stored object with an older copy of it (e.g., from a list page fetched before a detail request)
+UPSERT_SQL = """
+    INSERT INTO objects (kind, id, modify_date, version, payload, fetched_at) VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT (kind, id) DO UPDATE SET
+        modify_date = excluded.modify_date,
+        version = excluded.version,
+        payload = excluded.payload,
+        fetched_at = excluded.fetched_at
+    WHERE objects.modify_date IS NULL OR excluded.modify_date IS NULL OR excluded.modify_date >= objects.modify_date
+"""
+
+
+def to_payload(obj):
+    """Returns the data of a resource or record, keyed by field name as in API responses"""
+
+    if isinstance(obj, Record):
+        return {key: getattr(obj, attr) for attr, key, _ in obj._fields}
+
+    return {f.name: f.to_value(getattr(obj, f._attr_name), obj) for f in obj._meta.fields}
+
+
+class MetadataStore(object):
+    """
+    Stores dataset and import metadata (by `kind`, e.g. 'datasets') in a SQLite database at `path`. The database can be
+    shared by any number of processes and threads. Entries older than `max_age` seconds are considered stale, and are
+    revalidated by clients that use them.
+    """
+
+    def __init__(self, path, max_age=300, timeout=30):
+        self.path = path
+        self.max_age = max_age
+        self.timeout = timeout
+        self._local = threading.local()
+
+        conn = self.connection
+        conn.execute('PRAGMA journal_mode=WAL')
+        with conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    @property
+    def connection(self):
+        """A connection for the current thread (and process; connections must not be shared across a fork)"""
+
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.connection = sqlite3.connect(self.path, timeout=self.timeout)
+            self._local.pid = os.getpid()
+
+        return self._local.connection
+
+    def __getstate__(self):
+        return {'path': self.path, 'max_age': self.max_age, 'timeout': self.timeout}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def get(self, kind, id):
+        """Returns a `(payload, fetched_at)` tuple, or `None` if there is no such object"""
+
+        row = self.connection.execute(
+            'SELECT payload, fetched_at FROM objects WHERE kind = ? AND id = ?', (kind, id)
+        ).fetchone()
+
+        if row is None:
+            return None
+
+        return json.loads(row[0]), row[1]
+
+    def is_stale(self, fetched_at):
+        return time.time() - fetched_at > self.max_age
+
+    def put(self, kind, obj):
+        self.put_many(kind, [obj])
+
+    def put_many(self, kind, objects):
+        """Stores resources, records or payloads"""
+
+        now = time.time()
+        rows = []
+        for obj in objects:
+            payload = obj if isinstance(obj, dict) else to_payload(obj)
+            rows.append((
+                kind, payload['id'], payload.get('modify_date'), payload.get('version'), json.dumps(payload), now
+            ))
+
+        with self.connection as conn:
+            conn.executemany(UPSERT_SQL, rows)
+
+    def delete(self, kind, id):
+        with self.connection as conn:
+            conn.execute('DELETE FROM objects WHERE kind = ? AND id = ?', (kind, id))
+
+    def iter_payloads(self, kind):
+        for row in self.connection.execute('SELECT payload FROM objects WHERE kind = ? ORDER BY id', (kind,)):
+            yield json.loads(row[0])
+
+    def count(self, kind):
+        return self.connection.execute('SELECT COUNT(*) FROM objects WHERE kind = ?', (kind,)).fetchone()[0]
+
+    def get_state(self, key, default=None):
+        """Returns a stored bookkeeping value, such as a sync watermark"""
+
+        row = self.connection.execute('SELECT value FROM state WHERE key = ?', (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_state(self, key, value):
+        with self.connection as conn:
+            conn.execute('INSERT OR REPLACE INTO state (key, value) VALUES (?, ?)', (key, value))
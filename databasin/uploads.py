@@ -5,7 +5,8 @@ from requests import Session
 from restle import fields
 from restle.resources import Resource
 
-from databasin.utils import raise_for_authorization
+from databasin.records import make_record_class, RecordListField
+from databasin.utils import SessionToManyField, raise_for_authorization
 
 urlparse = six.moves.urllib_parse.urlparse  # IDE inspection trips over this as an import
 
@@ -56,4 +57,12 @@ class TemporaryFileResource(Resource):
 
 class TemporaryFileListResource(Resource):
     meta = fields.ObjectField('meta')
-    objects = fields.ToManyField(TemporaryFileResource, nest_type='full')
+    objects = SessionToManyField(TemporaryFileResource, nest_type='full')
+
+
+TemporaryFileRecord = make_record_class(TemporaryFileResource)
+
+
+class TemporaryFileRecordListResource(Resource):
+    meta = fields.ObjectField('meta')
+    objects = RecordListField(TemporaryFileRecord)
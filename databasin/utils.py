@@ -1,38 +1,479 @@
+import collections
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
 import six
+from restle import fields
 
 from databasin.exceptions import LoginRequiredError, ForbiddenError
 
+queue = six.moves.queue
 urlparse = six.moves.urllib_parse.urlparse  # IDE inspection trips over this as an import
+urlencode = six.moves.urllib_parse.urlencode
+quote_plus = six.moves.urllib_parse.quote_plus
+parse_qs = six.moves.urllib_parse.parse_qs
+
+# The outcome of one item of a batch operation: either `result` or `error` is set
+BatchResult = collections.namedtuple('BatchResult', ('id', 'result', 'error'))
 
 
 class ResourcePaginator(object):
-    def __init__(self, resource):
+    def __init__(self, resource, prefetch=0, parallel=0, ordered=True, cursor=None, on_page=None):
+        """
+        :param resource: The first (loaded) page of a list resource.
+        :param int prefetch: If greater than zero, up to this many upcoming pages are fetched in a background thread
+        while the current page is being iterated.
+        :param int parallel: If greater than zero, the offsets of all remaining pages are computed from the first
+        page's `total_count` and fetched using this many concurrent requests. Takes precedence over `prefetch`.
+        :param bool ordered: When fetching in parallel, whether objects are yielded in their original order (default)
+        or page by page as requests complete.
+        :param dict cursor: A value previously returned by `cursor`, which `resource` was loaded from. Iteration
+        resumes from the position it records.
+        :param on_page: A callable that is passed each page (list resource) as it is reached during iteration.
+        """
+
         self.resource = resource
         self.loaded_urls = set()
+        self.prefetch = prefetch
+        self.parallel = parallel
+        self.ordered = ordered
+        self.on_page = on_page
+
+        # Number of objects from the current page that have already been yielded
+        self._index = 0
+
+        if cursor is not None:
+            self.loaded_urls = set(cursor['loaded_urls'])
+            self._index = cursor['index']
+
+        if on_page is not None:
+            on_page(resource)
 
     def __iter__(self):
+        if self.parallel > 0 and self.resource.meta.total_count is not None:
+            return self._iter_parallel()
+        elif self.prefetch > 0:
+            return self._iter_prefetch()
+
+        return self._iter_serial()
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        """
+        Returns the object at `index`, or a list of objects for a slice. Only the pages overlapping the requested
+        range are fetched. This does not affect the position of iteration.
+        """
+
+        count = self.count()
+
+        if isinstance(index, slice):
+            start, stop, step = index.indices(count)
+            indices = range(start, stop, step)
+            if not indices:
+                return []
+
+            if abs(step) >= self._page_size():
+                # Each index is on a different page, so fetch only those pages rather than the whole range
+                return [self._get_range(i, i + 1)[0] for i in indices]
+
+            start = min(indices)
+            objects = self._get_range(start, max(indices) + 1)
+            if len(objects) < max(indices) + 1 - start:
+                raise IndexError('Pages returned fewer objects than expected')
+            return [objects[i - start] for i in indices]
+
+        if index < 0:
+            index += count
+        if not 0 <= index < count:
+            raise IndexError('Index out of range')
+
+        return self._get_range(index, index + 1)[0]
+
+    @property
+    def cursor(self):
+        """
+        A JSON-serializable record of the current position (the URL of the current page, including filters, and how
+        far into it iteration has progressed). Pass it back to the `list_*` method's `resume_from` argument to
+        continue from this point in a new paginator.
+        """
+
+        if self.parallel > 0 and not self.ordered:
+            raise ValueError('Unordered parallel iteration cannot be resumed from a cursor')
+
+        url = self.resource._url
+        if self.resource._params:
+            url += '?{0}'.format(urlencode(self.resource._params))
+
+        return {
+            'url': url,
+            'index': self._index,
+            'loaded_urls': sorted(self.loaded_urls)
+        }
+
+    def _set_page(self, resource, url=None):
+        self.resource = resource
+        self._index = 0
+
+        # Only pages the caller has reached are recorded, so that a cursor never skips pages fetched ahead
+        if url is not None:
+            self.loaded_urls.add(url.lower())
+
+        if self.on_page is not None:
+            self.on_page(resource)
+
+    def _iter_page(self):
+        """Yields the remaining objects on the current page"""
+
+        objects = self.resource.objects
+        while self._index < len(objects):
+            self._index += 1
+            yield objects[self._index - 1]
+
+    def _next_url(self, resource, loaded_urls):
+        """
+        Returns the URL of the page following `resource`, or `None` if there are no more pages (or the next page is in
+        `loaded_urls`)
+        """
+
+        if not resource.meta.next:
+            return None
+
+        o = urlparse(resource._url)
+        url = '{0}://{1}{2}'.format(o.scheme, o.netloc, resource.meta.next)
+        if url.lower() in loaded_urls:
+            return None
+
+        return url
+
+    def _page_size(self):
+        """
+        Returns the number of objects per page. This is the server's `limit`, which may be lower than requested (e.g.,
+        Tastypie caps it at `max_limit`), or else the number of objects on the current page.
+        """
+
+        return (
+            getattr(self.resource.meta, 'limit', None) or len(self.resource.objects) or
+            int(self.resource._params.get('limit', 0))
+        )
+
+    def _get_pages(self, resource, offset, count):
+        """
+        Fetches the pages of `resource` holding `count` objects starting at `offset`. If the server returns fewer
+        objects per page than requested, further pages are fetched to cover the range.
+        """
+
+        pages = []
+        received = 0
+
+        while received < count:
+            page = resource.get(
+                self._page_url(resource, offset + received, count - received), session=resource._session, lazy=False
+            )
+            if not page.objects:
+                break
+
+            pages.append(page)
+            received += len(page.objects)
+
+        return pages
+
+    def _page_url(self, resource, offset, limit):
+        params = dict(resource._params, offset=offset, limit=limit)
+        return '{0}?{1}'.format(resource._url, urlencode(params))
+
+    def _get_range(self, start, stop):
+        """Returns objects `start` through `stop` (exclusive), fetching the pages that overlap this range"""
+
+        size = self._page_size()
+        current_offset = int(self.resource._params.get('offset', 0))
+
+        # Reuse the current page if it holds the start of the range
+        if current_offset <= start < current_offset + len(self.resource.objects):
+            offset = current_offset
+            pages = [self.resource]
+        else:
+            offset = start - start % size
+            pages = self._get_pages(self.resource, offset, min(size, self.count() - offset))
+
+        objects = []
+        for page in pages:
+            objects.extend(page.objects)
+        objects = objects[start - offset:stop - offset]
+
+        # Fetch the rest of the range if these pages don't cover it
+        if len(objects) < stop - start:
+            for page in self._get_pages(self.resource, start + len(objects), stop - start - len(objects)):
+                objects.extend(page.objects)
+
+        return objects[:stop - start]
+
+    def _iter_serial(self):
         while True:
-            for obj in self.resource.objects:
+            for obj in self._iter_page():
                 yield obj
 
-            if not self.resource.meta.next:
+            url = self._next_url(self.resource, self.loaded_urls)
+            if url is None:
                 break
-            else:
-                o = urlparse(self.resource._url)
-                url = '{0}://{1}{2}'.format(o.scheme, o.netloc, self.resource.meta.next)
-                if url.lower() in self.loaded_urls:
+
+            self._set_page(self.resource.get(url, session=self.resource._session), url)
+
+    def _iter_prefetch(self):
+        pages = queue.Queue(maxsize=self.prefetch)
+        done = threading.Event()
+
+        def put(item):
+            while not done.is_set():
+                try:
+                    pages.put(item, timeout=.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def fetch(resource, loaded_urls):
+            try:
+                while not done.is_set():
+                    url = self._next_url(resource, loaded_urls)
+                    if url is None:
+                        break
+
+                    loaded_urls.add(url.lower())
+                    resource = resource.get(url, session=resource._session, lazy=False)
+                    put((resource, url, None))
+
+                put((None, None, None))
+            except Exception as e:
+                put((None, None, e))
+
+        # Make sure the current page is loaded before the worker reads `meta` from it
+        self.resource.meta
+
+        # The worker tracks the pages it fetches ahead separately from `loaded_urls`, which is updated as they're
+        # reached
+        worker = threading.Thread(target=fetch, args=(self.resource, set(self.loaded_urls)))
+        worker.daemon = True
+        worker.start()
+
+        try:
+            while True:
+                for obj in self._iter_page():
+                    yield obj
+
+                resource, url, error = pages.get()
+                if error is not None:
+                    raise error
+                if resource is None:
                     break
-                self.loaded_urls.add(url.lower())
 
-                self.resource = self.resource.get(url, session=self.resource._session)
+                self._set_page(resource, url)
+        finally:
+            done.set()
 
-    def __len__(self):
-        return self.count()
+    def _iter_parallel(self):
+        first = self.resource
+        size = self._page_size()
+        if not size:
+            return
+
+        start = int(first._params.get('offset', 0))
+        total_count = first.meta.total_count
+        offsets = iter(range(start + size, total_count, size))
+
+        def fetch(offset):
+            return self._get_pages(first, offset, min(size, total_count - offset))
+
+        executor = ThreadPoolExecutor(max_workers=self.parallel)
+
+        # At most `parallel` pages are in flight or waiting to be consumed at any time
+        if self.ordered:
+            pending = collections.deque(executor.submit(fetch, x) for x in itertools.islice(offsets, self.parallel))
+        else:
+            pending = set(executor.submit(fetch, x) for x in itertools.islice(offsets, self.parallel))
+
+        try:
+            for obj in self._iter_page():
+                yield obj
+
+            while pending:
+                if self.ordered:
+                    done = [pending.popleft()]
+                else:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    offset = next(offsets, None)
+                    if offset is not None:
+                        if self.ordered:
+                            pending.append(executor.submit(fetch, offset))
+                        else:
+                            pending.add(executor.submit(fetch, offset))
+
+                for future in done:
+                    for page in future.result():
+                        self._set_page(page)
+                        for obj in self._iter_page():
+                            yield obj
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
 
     def count(self):
         return self.resource.meta.total_count
 
 
+def map_concurrently(fn, items, max_workers=4):
+    """Calls `fn` on each item using a pool of threads, and returns the results in the same order as `items`"""
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(fn, items))
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key: while a call is in progress, other callers with its key wait for
+    it and share its result (or exception) instead of making their own.
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return {'calls': self.calls, 'coalesced': self.coalesced}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is None:
+                future = self._in_flight[key] = Future()
+                self.calls += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+
+def map_batch(fn, ids, max_workers=4):
+    """
+    Calls `fn` on each id using a pool of threads, and returns a `BatchResult` for each, in the same order as `ids`.
+    Exceptions raised by `fn` are returned as the `error` of the id's result rather than raised.
+    """
+
+    def call(id):
+        try:
+            return BatchResult(id, fn(id), None)
+        except Exception as e:
+            return BatchResult(id, None, e)
+
+    return map_concurrently(call, ids, max_workers=max_workers)
+
+
+def chunk_ids(ids, max_length):
+    """Splits `ids` into lists whose comma-separated, URL-encoded forms are at most `max_length` characters long"""
+
+    chunks = []
+    chunk = []
+    length = 0
+
+    for id in ids:
+        size = len(quote_plus(six.text_type(id)))
+        if chunk and length + len('%2C') + size > max_length:
+            chunks.append(chunk)
+            chunk = []
+            length = 0
+
+        length += size + (len('%2C') if chunk else 0)
+        chunk.append(id)
+
+    if chunk:
+        chunks.append(chunk)
+
+    return chunks
+
+
+def project_resource(resource_class, field_names):
+    """Returns a subclass of `resource_class` that declares only the fields in `field_names`"""
+
+    projected = type(resource_class.__name__, (resource_class,), {'__module__': resource_class.__module__})
+    projected._meta.fields = [f for f in projected._meta.fields if f.name in field_names]
+
+    return projected
+
+
+def build_resource(resource_class, data, url=None, session=None):
+    """
+    Returns a loaded resource populated from already-decoded response data. As with `Resource.get`, the query string of
+    `url` is split into the resource's parameters.
+    """
+
+    resource = resource_class(session=session)
+    resource._params = resource._meta.get_parameters.copy()
+    resource._url = url
+
+    if url is not None:
+        o = urlparse(url)
+        resource._params.update({k: v[0] if v else '' for k, v in six.iteritems(parse_qs(o.query))})
+        resource._url = '{0}://{1}{2}'.format('https' if resource._meta.force_https else o.scheme, o.netloc, o.path)
+
+    resource.populate_field_values(data)
+
+    return resource
+
+
+class SessionToManyField(fields.ToManyField):
+    """
+    A `ToManyField` whose (fully nested) resources share the parent resource's session, and so its client, instead of
+    each getting a new session.
+    """
+
+    def to_python(self, value, resource):
+        if self.type != self.FULL_OBJECT:
+            return super(SessionToManyField, self).to_python(value, resource)
+
+        if value is None:
+            return []
+
+        if not isinstance(value, list):
+            raise ValueError("Expected a list for 'to many' value, got '{0}'".format(value.__class__.__name__))
+
+        objects = []
+        for data in value:
+            if not isinstance(data, dict):
+                raise ValueError(
+                    "Expected nested resource to be of type 'dict', got '{0}'".format(data.__class__.__name__)
+                )
+
+            nested = build_resource(self.resource_class, data, session=resource._session)
+            if self.relative_path:
+                nested._url = self.get_uri(data, resource._url)
+
+            objects.append(nested)
+
+        return objects
+
+
 def raise_for_authorization(response, is_logged_in):
     """Raises `LoginRequiredError` or `ForbiddenError` when appropriate"""
 
@@ -0,0 +1,271 @@
+from __future__ import absolute_import
+
+import asyncio
+import json
+import threading
+
+import pytest
+import six
+
+from databasin.client import build_netcdf_archive
+from databasin.exceptions import LoginRequiredError, ForbiddenError, JobTimeoutError
+from .utils import AuthenticationError, verify_api_key_headers
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from databasin.aio import AsyncClient
+
+
+@pytest.fixture()
+def dataset_data():
+    return {
+        'id': 'a1b2c3',
+        'owner_id': 'user',
+        'private': False,
+        'title': 'Some Dataset',
+        'snippet': 'This dataset is...',
+        'create_date': '2015-11-17T22:42:06+00:00',
+        'modify_date': '2015-11-17T22:42:06+00:00',
+        'native': True,
+        'tags': ['one', 'two'],
+        'credits': None
+    }
+
+
+@pytest.fixture
+def job_data():
+    return {
+        'id': '1234',
+        'job_name': 'foo_job',
+        'status': 'queued',
+        'progress': 0,
+        'message': None
+    }
+
+
+def run_with_server(routes, fn, key=None):
+    """Runs `fn(client)` against a local server handling `routes` ({(method, path): handler})"""
+
+    async def main():
+        app = web.Application()
+        for (method, path), handler in routes.items():
+            app.router.add_route(method, path, handler)
+
+        if key is not None:
+            @web.middleware
+            async def check_api_key(request, handler):
+                try:
+                    verify_api_key_headers(request.headers, key)
+                except AuthenticationError:
+                    return web.Response(status=401)
+                return await handler(request)
+
+            app.middlewares.append(check_api_key)
+
+        async with TestServer(app, host='localhost') as server:
+            async with AsyncClient() as c:
+                c.base_url = str(server.make_url(''))
+                if key is not None:
+                    c.set_api_key('user', key)
+
+                return await fn(c)
+
+    return asyncio.run(main())
+
+
+def json_handler(data, status=200):
+    async def handler(request):
+        return web.json_response(data, status=status)
+
+    return handler
+
+
+def test_get_dataset(dataset_data):
+    async def fn(c):
+        return await c.get_dataset('a1b2c3')
+
+    dataset = run_with_server({('GET', '/api/v1/datasets/a1b2c3/'): json_handler(dataset_data)}, fn)
+
+    assert dataset.id == 'a1b2c3'
+    assert dataset.tags == dataset_data['tags']
+    assert dataset.credits is None
+
+
+def test_get_dataset_with_api_key(dataset_data):
+    async def fn(c):
+        return await c.get_dataset('a1b2c3')
+
+    dataset = run_with_server(
+        {('GET', '/api/v1/datasets/a1b2c3/'): json_handler(dataset_data)}, fn, key='abcde12345'
+    )
+
+    assert dataset.id == 'a1b2c3'
+
+
+def test_get_dataset_login_required():
+    async def fn(c):
+        with pytest.raises(LoginRequiredError):
+            await c.get_dataset('a1b2c3')
+
+        c.username = 'foo'
+        with pytest.raises(ForbiddenError):
+            await c.get_dataset('a1b2c3')
+
+    run_with_server({('GET', '/api/v1/datasets/a1b2c3/'): json_handler({}, status=401)}, fn)
+
+
+def test_list_datasets(dataset_data):
+    page1_data = {
+        'meta': {'next': '/api/v1/datasets/?limit=2&offset=2', 'total_count': 3},
+        'objects': [dataset_data, dict(dataset_data, id='a1b2c4')]
+    }
+    page2_data = {
+        'meta': {'next': None, 'total_count': 3},
+        'objects': [dict(dataset_data, id='a1b2c5')]
+    }
+
+    async def list_handler(request):
+        return web.json_response(page2_data if request.query.get('offset') == '2' else page1_data)
+
+    async def fn(c):
+        datasets = [dataset async for dataset in c.list_datasets(items_per_page=2)]
+
+        # Nested resources get their URLs from the list URL, without its query string
+        assert datasets[0]._url == c.build_url('/api/v1/datasets/a1b2c3/')
+        assert datasets[2]._url == c.build_url('/api/v1/datasets/a1b2c5/')
+
+        return datasets
+
+    datasets = run_with_server({('GET', '/api/v1/datasets/'): list_handler}, fn, key='abcde12345')
+
+    assert [d.id for d in datasets] == ['a1b2c3', 'a1b2c4', 'a1b2c5']
+
+
+def test_list_my_datasets_without_user():
+    async def fn(c):
+        return [dataset async for dataset in c.list_my_datasets()]
+
+    assert run_with_server({}, fn) == []
+
+
+def test_create_job_block(job_data, monkeypatch):
+    responses = [job_data, job_data, dict(job_data, status='succeeded')]
+    posted = []
+
+    async def create_handler(request):
+        posted.append(await request.json())
+        return web.Response(status=201, headers={'Location': '/api/v1/jobs/1234/'})
+
+    async def job_handler(request):
+        return web.json_response(responses.pop(0))
+
+    async def sleep(seconds):
+        pass
+
+    monkeypatch.setattr('databasin.aio.asyncio.sleep', sleep)
+
+    async def fn(c):
+        return await c.create_job('foo_job', job_args={'foo': 'bar'}, block=True)
+
+    job = run_with_server(
+        {('POST', '/api/v1/jobs/'): create_handler, ('GET', '/api/v1/jobs/1234/'): job_handler}, fn, key='abcde12345'
+    )
+
+    assert job.status == 'succeeded'
+    assert not responses
+    assert posted == [{'job_name': 'foo_job', 'job_args': {'foo': 'bar'}}]
+
+
+def test_join_job_timeout(job_data):
+    async def fn(c):
+        job = await c.get_job('1234')
+        with pytest.raises(JobTimeoutError):
+            await c.join_job(job, timeout=.05, poll=.01)
+
+        return job
+
+    job = run_with_server({('GET', '/api/v1/jobs/1234/'): json_handler(job_data)}, fn)
+
+    assert job.status == 'queued'
+
+
+def test_upload_temporary_file():
+    tmp_file_data = {
+        'uuid': '1234',
+        'date': '2015-11-17T22:42:06+00:00',
+        'is_image': False,
+        'filename': 'foo.txt',
+        'url': 'https://example.com/file.txt'
+    }
+    uploads = []
+
+    async def home_handler(request):
+        response = web.Response()
+        response.set_cookie('csrftoken', 'abcd')
+        return response
+
+    async def upload_handler(request):
+        data = await request.post()
+        uploads.append((request.headers.get('X-CSRFToken'), data['csrfmiddlewaretoken'], data['file'].filename))
+        return web.json_response({'uuid': '1234'})
+
+    async def fn(c):
+        return await c.upload_temporary_file(six.BytesIO(b'foo'), filename='foo.txt')
+
+    tmp_file = run_with_server({
+        ('GET', '/'): home_handler,
+        ('POST', '/uploads/upload-temporary-file/'): upload_handler,
+        ('GET', '/api/v1/uploads/temporary-files/1234/'): json_handler(tmp_file_data)
+    }, fn)
+
+    assert tmp_file.uuid == '1234'
+    assert uploads == [('abcd', 'abcd', 'foo.txt')]
+
+
+def test_import_netcdf_dataset(dataset_data, tmp_path, monkeypatch):
+    nc_file = tmp_path / 'test.nc'
+    nc_file.write_bytes(b'')
+
+    job_data = {
+        'id': '1234',
+        'job_name': 'create_import_job',
+        'status': 'succeeded',
+        'progress': 100,
+        'message': json.dumps({'next_uri': '/datasets/a1b2c3/'})
+    }
+
+    async def upload_handler(request):
+        return web.json_response({'uuid': 'abcd'})
+
+    async def create_handler(request):
+        return web.Response(status=201, headers={'Location': '/api/v1/jobs/1234/'})
+
+    threads = []
+
+    def build_archive(*args):
+        threads.append(threading.current_thread())
+        return build_netcdf_archive(*args)
+
+    monkeypatch.setattr('databasin.aio.build_netcdf_archive', build_archive)
+
+    async def fn(c):
+        c.get_session().cookie_jar.update_cookies({'csrftoken': 'abcd'})
+        return await c.import_netcdf_dataset(str(nc_file), style={'foo': 'bar'})
+
+    dataset = run_with_server({
+        ('POST', '/uploads/upload-temporary-file/'): upload_handler,
+        ('GET', '/api/v1/uploads/temporary-files/abcd/'): json_handler({
+            'uuid': 'abcd', 'date': '2015-11-17T22:42:06+00:00', 'is_image': False, 'filename': '', 'url': ''
+        }),
+        ('POST', '/api/v1/jobs/'): create_handler,
+        ('GET', '/api/v1/jobs/1234/'): json_handler(job_data),
+        ('GET', '/api/v1/datasets/a1b2c3/'): json_handler(dataset_data)
+    }, fn)
+
+    assert dataset.id == 'a1b2c3'
+
+    # The archive is built in an executor, not on the event loop's thread
+    assert len(threads) == 1 and threads[0] is not threading.main_thread()
@@ -0,0 +1,164 @@
+from __future__ import absolute_import
+
+import json
+
+import pytest
+
+from databasin.cache import FileCache, MemoryCache, TTLCache
+from databasin.client import Client
+from .utils import StubServer
+
+
+@pytest.fixture()
+def dataset_data():
+    return {
+        'id': 'a1b2c3',
+        'owner_id': 'user',
+        'private': False,
+        'title': 'Some Dataset',
+        'snippet': 'This dataset is...',
+        'create_date': '2015-11-17T22:42:06+00:00',
+        'modify_date': '2015-11-17T22:42:06+00:00',
+        'native': True,
+        'tags': ['one', 'two'],
+        'credits': None
+    }
+
+
+def make_etag_handler(data, etag='"abc"'):
+    def handler(request):
+        if request.headers.get('If-None-Match') == etag:
+            return 304, {'ETag': etag}, b''
+
+        return 200, {'ETag': etag, 'Content-Type': 'application/json'}, json.dumps(data)
+
+    return handler
+
+
+@pytest.mark.parametrize('make_cache', [MemoryCache, lambda: FileCache('cache')], ids=['memory', 'file'])
+def test_conditional_get_dataset(dataset_data, make_cache, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    with StubServer(make_etag_handler(dataset_data)) as server:
+        c = Client(cache=make_cache())
+        c.base_url = server.url
+
+        dataset = c.get_dataset('a1b2c3')
+        assert dataset.title == 'Some Dataset'
+        assert c.adapter.stats == {'hits': 0, 'misses': 1}
+
+        dataset = c.get_dataset('a1b2c3')
+        assert dataset.title == 'Some Dataset'
+        assert dataset.tags == ['one', 'two']
+        assert c.adapter.stats == {'hits': 1, 'misses': 1}
+
+        assert 'If-None-Match' not in server.requests[0].headers
+        assert server.requests[1].headers['If-None-Match'] == '"abc"'
+
+
+def test_last_modified(dataset_data):
+    last_modified = 'Tue, 17 Nov 2015 22:42:06 GMT'
+
+    def handler(request):
+        if request.headers.get('If-Modified-Since') == last_modified:
+            return 304, {}, b''
+
+        return 200, {'Last-Modified': last_modified}, json.dumps(dataset_data)
+
+    with StubServer(handler) as server:
+        c = Client(cache=MemoryCache())
+        c.base_url = server.url
+
+        c.get_dataset('a1b2c3')
+        c.get_dataset('a1b2c3')
+
+        assert c.adapter.stats == {'hits': 1, 'misses': 1}
+
+
+def test_lowercase_validators(dataset_data):
+    last_modified = 'Tue, 17 Nov 2015 22:42:06 GMT'
+
+    def handler(request):
+        validators = (request.headers.get('If-None-Match'), request.headers.get('If-Modified-Since'))
+        if validators == ('"abc"', last_modified):
+            return 304, {}, b''
+
+        return 200, {'etag': '"abc"', 'last-modified': last_modified}, json.dumps(dataset_data)
+
+    with StubServer(handler) as server:
+        c = Client(cache=MemoryCache())
+        c.base_url = server.url
+
+        c.get_dataset('a1b2c3')
+        c.get_dataset('a1b2c3')
+
+        assert c.adapter.stats == {'hits': 1, 'misses': 1}
+
+
+def test_no_validators_not_cached(dataset_data):
+    with StubServer(lambda request: (200, {}, json.dumps(dataset_data))) as server:
+        cache = MemoryCache()
+        c = Client(cache=cache)
+        c.base_url = server.url
+
+        c.get_dataset('a1b2c3')
+        c.get_dataset('a1b2c3')
+
+        assert c.adapter.stats == {'hits': 0, 'misses': 2}
+        assert not cache._data
+
+
+def test_cache_varies_by_user(dataset_data):
+    with StubServer(make_etag_handler(dataset_data)) as server:
+        cache = MemoryCache()
+        c = Client(cache=cache)
+        c.base_url = server.url
+        c.set_api_key('foo', 'abcde12345')
+        c.get_dataset('a1b2c3')
+
+        c.set_api_key('bar', 'abcde12345')
+        c.get_dataset('a1b2c3')
+
+        assert 'If-None-Match' not in server.requests[1].headers
+        assert len(cache._data) == 2
+
+
+def test_memory_cache_maxsize():
+    cache = MemoryCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_file_cache(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    cache.set('a', {'headers': {'ETag': 'abc'}, 'content': b'\x00foo'})
+
+    assert FileCache(str(tmp_path / 'cache')).get('a') == {'headers': {'ETag': 'abc'}, 'content': b'\x00foo'}
+
+    cache.delete('a')
+    assert cache.get('a') is None
+
+
+def test_ttl_cache(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr('databasin.cache.time.monotonic', lambda: now[0])
+
+    cache = TTLCache(maxsize=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+
+    now[0] += 11
+    assert cache.get('a') is None
+    assert cache.get('c') is None
+    assert len(cache) == 0
@@ -0,0 +1,93 @@
+from __future__ import absolute_import
+
+import pytest
+
+from databasin.catalog import LocalCatalog
+from databasin.datasets import DatasetResource
+from databasin.store import MetadataStore
+from databasin.utils import build_resource
+
+
+@pytest.fixture()
+def catalog():
+    def dataset(id, **kwargs):
+        data = {
+            'id': id,
+            'owner_id': 'user',
+            'private': False,
+            'title': 'Dataset {0}'.format(id),
+            'create_date': '2015-11-17T22:42:06+00:00',
+            'modify_date': '2015-11-17T22:42:06+00:00',
+            'native': True,
+            'tags': [],
+            'file_size': None
+        }
+        data.update(kwargs)
+        return data
+
+    return LocalCatalog([
+        dataset('a', tags=['one', 'two'], file_size=100),
+        dataset('b', owner_id='other', private=True, tags=['two'], file_size=200),
+        dataset('c', native=False, is_aggregate=True, file_size=200),
+        dataset('d', title='Other', file_size=300),
+        dataset('e')
+    ])
+
+
+def ids(datasets):
+    return [x.id for x in datasets]
+
+
+def test_catalog_exact(catalog):
+    assert ids(catalog.filter({'owner_id': 'user'})) == ['a', 'c', 'd', 'e']
+    assert ids(catalog.filter({'private': 'true'})) == ['b']
+    assert ids(catalog.filter({'native': False, 'is_aggregate': True})) == ['c']
+    assert ids(catalog.filter({'tags': 'two', 'owner_id': 'user'})) == ['a']
+    assert ids(catalog.filter({'title': 'Other'})) == ['d']
+
+
+def test_catalog_in(catalog):
+    assert ids(catalog.filter({'owner_id__in': 'other,nobody'})) == ['b']
+    assert ids(catalog.filter({'tags__in': ['one', 'two']})) == ['a', 'b']
+    assert ids(catalog.filter({'id__in': 'e,a'})) == ['a', 'e']
+
+
+def test_catalog_range(catalog):
+    assert ids(catalog.filter({'file_size__gt': 200})) == ['d']
+    assert ids(catalog.filter({'file_size__gte': '200'})) == ['b', 'c', 'd']
+    assert ids(catalog.filter({'file_size__lt': 200})) == ['a']
+    assert ids(catalog.filter({'file_size__lte': 200, 'file_size__gt': 100})) == ['b', 'c']
+    assert ids(catalog.filter({'title__gte': 'Other'})) == ['d']
+
+
+def test_catalog_ordering(catalog):
+    assert ids(catalog.filter({'order_by': 'file_size'})) == ['a', 'b', 'c', 'd', 'e']
+    assert ids(catalog.filter({'order_by': '-file_size', 'limit': 3})) == ['e', 'd', 'b']
+    assert ids(catalog.filter({'order_by': ['owner_id', '-id'], 'offset': 1})) == ['e', 'd', 'c', 'a']
+    assert catalog.count({'file_size__gte': 200, 'limit': 1}) == 3
+
+
+def test_catalog_update(catalog):
+    catalog.add(build_resource(DatasetResource, dict(catalog.get('a').as_dict(), file_size=500, tags=['three'])))
+
+    assert ids(catalog.filter({'file_size__gt': 300})) == ['a']
+    assert ids(catalog.filter({'tags': 'one'})) == []
+
+    catalog.remove('a')
+    assert 'a' not in catalog
+    assert ids(catalog.filter({'tags': 'three'})) == []
+
+
+def test_catalog_invalid_filters(catalog):
+    with pytest.raises(ValueError):
+        catalog.filter({'foo': 'bar'})
+
+    with pytest.raises(ValueError):
+        catalog.filter({'title__startswith': 'D'})
+
+
+def test_catalog_from_store(catalog, tmp_path):
+    store = MetadataStore(str(tmp_path / 'metadata.sqlite3'))
+    store.put_many('datasets', list(catalog))
+
+    assert ids(LocalCatalog.from_store(store).filter({'tags': 'two'})) == ['a', 'b']
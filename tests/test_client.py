@@ -2,16 +2,26 @@ from __future__ import absolute_import
 
 import copy
 import json
+import os
+import pickle
+import signal
+import threading
+import time
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 import requests_mock
 import six
+from requests import Session
 from requests.models import Request
 
+from databasin.cache import MemoryCache, TTLCache
 from databasin.client import Client
-from databasin.exceptions import DatasetImportError
-from .utils import make_api_key_callback
+from databasin.exceptions import DatasetImportError, LoginRequiredError
+from databasin.ratelimit import RateLimiter
+from databasin.retry import RetryPolicy
+from .utils import AuthenticationError, StubServer, make_api_key_callback, verify_api_key_headers
 
 try:
     from unittest import mock  # Py3
@@ -386,3 +396,233 @@ def test_import_netcdf_dataset_incomplete(import_job_data, tmp_file_data, datase
                 c.import_netcdf_dataset('test.zip')
 
             assert m.call_count == 6
+
+
+def test_coalesce_concurrent_requests(dataset_data):
+    release = threading.Event()
+
+    def callback(request, context):
+        release.wait(5)
+        return json.dumps(dataset_data)
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=callback)
+
+        c = Client(coalesce=True)
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            futures = [executor.submit(c.get_dataset, 'a1b2c3') for _ in range(5)]
+
+            while c.single_flight.coalesced < 4:
+                time.sleep(.01)
+            release.set()
+
+            assert {f.result().title for f in futures} == {dataset_data['title']}
+
+        assert m.call_count == 1
+        assert c.single_flight.stats == {'calls': 1, 'coalesced': 4}
+
+        c.get_dataset('a1b2c3')
+        assert m.call_count == 2
+
+
+def test_coalesce_shares_errors():
+    release = threading.Event()
+
+    def callback(request, context):
+        release.wait(5)
+        context.status_code = 401
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', text=callback)
+
+        c = Client(coalesce=True)
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(c.get_job, '1234') for _ in range(2)]
+
+            while c.single_flight.coalesced < 1:
+                time.sleep(.01)
+            release.set()
+
+            for future in futures:
+                with pytest.raises(LoginRequiredError):
+                    future.result()
+
+        assert m.call_count == 1
+
+
+def test_api_key_signing_thread_safety(dataset_data):
+    key = 'abcde12345'
+    failures = []
+
+    def handler(request):
+        try:
+            verify_api_key_headers(request.headers, key)
+        except AuthenticationError as e:
+            failures.append(str(e))
+            return 401, {}, b''
+
+        return 200, {'Content-Type': 'application/json'}, json.dumps(dataset_data)
+
+    with StubServer(handler) as server:
+        c = Client(user='user', api_key=key)
+        c.base_url = server.url
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            datasets = list(executor.map(lambda _: c.get_dataset('a1b2c3'), range(200)))
+
+        assert len(server.requests) == 200
+        assert not failures
+        assert all(dataset.id == 'a1b2c3' for dataset in datasets)
+        assert 'x-api-signature' not in c._session.headers
+
+
+def test_connection_pool_options(dataset_data):
+    with StubServer(lambda request: (200, {}, json.dumps(dataset_data))) as server:
+        c = Client(pool_maxsize=4, pool_block=True, keep_alive=False)
+        c.base_url = server.url
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: c.get_dataset('a1b2c3'), range(16)))
+
+        pool = c.adapter.poolmanager.connection_from_url(server.url)
+        assert pool.block
+        assert pool.pool.maxsize == 4
+        assert all(r.headers['Connection'] == 'close' for r in server.requests)
+
+
+def test_shared_adapter(dataset_data):
+    with StubServer(lambda request: (200, {}, json.dumps(dataset_data))) as server:
+        c1 = Client()
+        c2 = Client(adapter=c1.adapter)
+        c1.base_url = c2.base_url = server.url
+
+        c1.get_dataset('a1b2c3')
+        c2.get_dataset('a1b2c3')
+
+        assert c2.adapter is c1.adapter
+        assert len(c1.adapter.poolmanager.pools) == 1
+        assert server.requests[1].headers.get('Connection') != 'close'
+
+
+def test_pickle_client(dataset_data):
+    c = Client(user='user', api_key='abcde12345', cache=MemoryCache(), dataset_cache=TTLCache(), coalesce=True)
+    c._session.cookies.set('sessionid', 'abc', domain='databasin.org')
+
+    c2 = pickle.loads(pickle.dumps(c))
+
+    assert c2.username == 'user'
+    assert c2.api_key == b'abcde12345'
+    assert c2.adapter.cache is not c.adapter.cache
+    assert c2.single_flight is not None
+    assert c2._current_session is None
+    assert Client(user='user', api_key='abcde12345')._current_session is None
+
+    with requests_mock.mock() as m:
+        m.get(
+            'https://databasin.org/api/v1/datasets/a1b2c3/',
+            text=make_api_key_callback(json.dumps(dataset_data), 'abcde12345')
+        )
+
+        assert c2.get_dataset('a1b2c3').id == 'a1b2c3'
+        assert m.last_request.headers['Cookie'] == 'sessionid=abc'
+        assert c2._session.client is c2
+
+
+def test_pickle_client_concurrent_session():
+    c = Client()
+    c._session.cookies.set('sessionid', 'abc', domain='databasin.org')
+    c2 = pickle.loads(pickle.dumps(c))
+
+    def make_session():
+        # Widen the window in which threads could race to create the session
+        time.sleep(.05)
+        return Session()
+
+    with mock.patch('databasin.client.Session', side_effect=make_session):
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            sessions = list(executor.map(lambda _: c2._session, range(4)))
+
+    assert all(session is sessions[0] for session in sessions)
+    assert sessions[0].cookies.get('sessionid') == 'abc'
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_client_after_fork(dataset_data):
+    with StubServer(lambda request: (200, {}, json.dumps(dataset_data))) as server:
+        c = Client(coalesce=True)
+        c.base_url = server.url
+        c.get_dataset('a1b2c3')
+
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                ok = c.get_dataset('a1b2c3').id == 'a1b2c3' and c.adapter._pid == c._pid == os.getpid()
+            finally:
+                os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        assert status == 0
+
+        c.get_dataset('a1b2c3')
+        assert len(server.requests) == 3
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requires os.fork')
+def test_client_after_fork_with_rate_limiter(dataset_data):
+    started = threading.Event()
+    release = threading.Event()
+
+    def handler(request):
+        if 'slow' in request.path:
+            started.set()
+            release.wait(5)
+        return 200, {}, json.dumps(dataset_data)
+
+    with StubServer(handler) as server:
+        c = Client(rate_limiter=RateLimiter(max_in_flight=1), retry_policy=RetryPolicy())
+        c.base_url = server.url
+
+        # Fork while the parent holds the only in-flight slot
+        thread = threading.Thread(target=c.get_dataset, args=('slow',))
+        thread.start()
+        assert started.wait(5)
+
+        pid = os.fork()
+        if pid == 0:
+            ok = False
+            try:
+                signal.alarm(5)
+                ok = c.get_dataset('a1b2c3').id == 'a1b2c3'
+            finally:
+                os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        release.set()
+        thread.join()
+
+        assert status == 0
+
+
+def test_import_many(import_netcdf_job_data, dataset_data, tmp_file_data, tmp_path):
+    paths = []
+    for name in ('one.nc', 'two.nc', 'three.nc'):
+        (tmp_path / name).write_bytes(b'CDF')
+        paths.append(str(tmp_path / name))
+    paths.insert(1, str(tmp_path / 'bad.txt'))
+
+    with requests_mock.mock() as m:
+        m.post('https://databasin.org/uploads/upload-temporary-file/', text=json.dumps({'uuid': 'abcd'}))
+        m.get('https://databasin.org/api/v1/uploads/temporary-files/abcd/', text=json.dumps(tmp_file_data))
+        m.post('https://databasin.org/api/v1/jobs/', headers={'Location': '/api/v1/jobs/1234/'})
+        m.get('https://databasin.org/api/v1/jobs/1234/', text=json.dumps(import_netcdf_job_data))
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dataset_data))
+
+        c = Client()
+        c._session.cookies['csrftoken'] = 'abcd'
+        results = c.import_many(paths, workers=2, style={'foo': 'bar'})
+
+        assert [r.id for r in results] == paths
+        assert [r.result.id for r in results if r.error is None] == ['a1b2c3'] * 3
+        assert isinstance(results[1].error, ValueError)
+        assert len([r for r in m.request_history if r.path == '/uploads/upload-temporary-file/']) == 3
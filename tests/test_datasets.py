@@ -2,10 +2,13 @@ from __future__ import absolute_import
 
 import copy
 import json
+import time
 
 import pytest
 import requests_mock
+from restle.exceptions import HTTPException, NotFoundException
 
+from databasin.cache import TTLCache
 from databasin.client import Client
 from databasin.exceptions import LoginRequiredError, ForbiddenError
 from .utils import make_api_key_callback
@@ -27,6 +30,24 @@ def dataset_data():
     }
 
 
+def make_capped_pages_callback(dataset_data, total_count, max_limit):
+    """Returns a callback serving `total_count` datasets, with the limit capped at `max_limit` as Tastypie does"""
+
+    def callback(request, context):
+        offset = int(request.qs.get('offset', ['0'])[0])
+        limit = min(int(request.qs.get('limit', [max_limit])[0]) or max_limit, max_limit)
+        next_url = None
+        if offset + limit < total_count:
+            next_url = '/api/v1/datasets/?limit={0}&offset={1}'.format(limit, offset + limit)
+
+        return json.dumps({
+            'meta': {'limit': limit, 'offset': offset, 'next': next_url, 'total_count': total_count},
+            'objects': [dict(dataset_data, id=str(i)) for i in range(offset, min(offset + limit, total_count))]
+        })
+
+    return callback
+
+
 @pytest.fixture()
 def dataset_import_data():
     return {
@@ -96,6 +117,143 @@ def test_get_dataset_with_api_key(dataset_data):
         assert dataset.credits is None
 
 
+def test_get_dataset_cached(dataset_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dataset_data))
+        m.patch('https://databasin.org/api/v1/datasets/a1b2c3/')
+
+        c = Client(dataset_cache=TTLCache())
+        dataset = c.get_dataset('a1b2c3')
+
+        assert c.get_dataset('a1b2c3') is dataset
+        assert m.call_count == 1
+
+        dataset.make_private()
+        assert dataset.private is True
+        assert m.call_count == 2
+
+        c.get_dataset('a1b2c3')
+        assert m.call_count == 3
+
+        c.set_api_key('user', 'abcde12345')
+        c.get_dataset('a1b2c3')
+        assert m.call_count == 4
+
+
+def test_get_datasets(dataset_data):
+    with requests_mock.mock() as m:
+        for i in range(10):
+            m.get(
+                'https://databasin.org/api/v1/datasets/{0}/'.format(i),
+                text=json.dumps(dict(dataset_data, id=str(i)))
+            )
+        m.get('https://databasin.org/api/v1/datasets/3/', status_code=401)
+        m.get('https://databasin.org/api/v1/datasets/7/', status_code=404)
+
+        c = Client()
+        c.username = 'foo'
+        results = c.get_datasets([str(i) for i in range(10)], max_workers=3)
+
+        assert [r.id for r in results] == [str(i) for i in range(10)]
+        assert [r.result.id for r in results if r.error is None] == ['0', '1', '2', '4', '5', '6', '8', '9']
+        assert isinstance(results[3].error, ForbiddenError)
+        assert isinstance(results[7].error, NotFoundException)
+
+
+def test_get_datasets_batched(dataset_data):
+    def callback(request, context):
+        ids = request.qs['id__in'][0].split(',')
+        objects = [dict(dataset_data, id=id) for id in ids if id != 'dataset0007']
+        return json.dumps({'meta': {'next': None, 'total_count': len(objects)}, 'objects': objects})
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', text=callback)
+
+        c = Client()
+        ids = ['dataset{0:04d}'.format(i) for i in range(300)] + ['dataset0001']
+        results = c.get_datasets(ids, batched=True)
+
+        assert 1 < m.call_count < 5
+        assert all(len(r.url) <= 2000 for r in m.request_history)
+        assert [r.id for r in results] == ids
+        assert [r.result.id for r in results if r.result is not None] == [x for x in ids if x != 'dataset0007']
+        assert isinstance(results[7].error, NotFoundException)
+
+
+def test_get_datasets_batched_cache(dataset_data):
+    def callback(request, context):
+        ids = request.qs['id__in'][0].split(',')
+        objects = [dict(dataset_data, id=id) for id in ids]
+        return json.dumps({'meta': {'next': None, 'total_count': len(objects)}, 'objects': objects})
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dataset_data))
+        m.get('https://databasin.org/api/v1/datasets/', text=callback)
+
+        c = Client(dataset_cache=TTLCache())
+        c.get_dataset('a1b2c3')
+
+        # Cached datasets aren't requested again, and non-string ids are matched to the ids the API returns
+        results = c.get_datasets(['a1b2c3', 1, 2], batched=True)
+
+        assert m.call_count == 2
+        assert m.last_request.qs['id__in'] == ['1,2']
+        assert [r.id for r in results] == ['a1b2c3', 1, 2]
+        assert [r.result.id for r in results] == ['a1b2c3', '1', '2']
+        assert c.dataset_cache.get(1).id == '1'
+
+
+def test_get_datasets_batched_login_required():
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', status_code=401)
+
+        c = Client()
+        results = c.get_datasets(['a1b2c3', 'd4e5f6'], batched=True)
+
+        assert all(isinstance(r.error, LoginRequiredError) for r in results)
+
+
+def test_get_dataset_negative_cache(dataset_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', status_code=401)
+        m.get('https://databasin.org/api/v1/datasets/d4e5f6/', status_code=404)
+        m.get('https://databasin.org/api/v1/datasets/g7h8i9/', status_code=500)
+
+        c = Client(negative_cache=TTLCache(ttl=30))
+        for _ in range(2):
+            with pytest.raises(LoginRequiredError):
+                c.get_dataset('a1b2c3')
+            with pytest.raises(NotFoundException):
+                c.get_dataset('d4e5f6')
+            with pytest.raises(HTTPException):
+                c.get_dataset('g7h8i9')
+
+        assert m.call_count == 4
+
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dataset_data))
+        c.set_api_key('user', 'abcde12345')
+        assert c.get_dataset('a1b2c3').title == dataset_data['title']
+
+
+def test_listed_dataset_invalidates_cache(dataset_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dataset_data))
+        m.get(
+            'https://databasin.org/api/v1/datasets/',
+            text=json.dumps({'meta': {'next': None, 'total_count': 1}, 'objects': [dataset_data]})
+        )
+        m.patch('https://databasin.org/api/v1/datasets/a1b2c3/')
+
+        c = Client(dataset_cache=TTLCache())
+        c.get_dataset('a1b2c3')
+
+        listed = list(c.list_datasets())[0]
+        assert listed._session is c._session
+
+        listed.make_private()
+        assert len(c.dataset_cache) == 0
+
+
 def test_dataset_make_public(dataset_data):
     with requests_mock.mock() as m:
         m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dataset_data))
@@ -319,6 +477,294 @@ def test_datasets_pagination_with_api_key(dataset_data):
         assert datasets[2].id == 'a1b2c5'
 
 
+def test_datasets_pagination_prefetch(dataset_data):
+    with requests_mock.mock() as m:
+        pages = []
+        for i in range(4):
+            page = {
+                'meta': {
+                    'next': '/api/v1/datasets/?limit=1&offset={}'.format(i + 1) if i < 3 else None,
+                    'total_count': 4
+                },
+                'objects': [copy.copy(dataset_data)]
+            }
+            page['objects'][0]['id'] = 'a1b2c{}'.format(i)
+            pages.append(page)
+
+        m.get('https://databasin.org/api/v1/datasets/?limit=1', text=json.dumps(pages[0]))
+        for i in range(1, 4):
+            m.get(
+                'https://databasin.org/api/v1/datasets/?limit=1&offset={}'.format(i), text=json.dumps(pages[i])
+            )
+
+        c = Client()
+        datasets = c.list_datasets(items_per_page=1, prefetch=2)
+
+        assert len(datasets) == 4
+        datasets = list(datasets)
+        assert m.call_count == 4
+        assert [d.id for d in datasets] == ['a1b2c0', 'a1b2c1', 'a1b2c2', 'a1b2c3']
+
+
+def test_datasets_pagination_prefetch_error(dataset_data):
+    with requests_mock.mock() as m:
+        page1_data = {
+            'meta': {'next': '/api/v1/datasets/?limit=1&offset=1', 'total_count': 2},
+            'objects': [dataset_data]
+        }
+        m.get('https://databasin.org/api/v1/datasets/', text=json.dumps(page1_data))
+        m.get('https://databasin.org/api/v1/datasets/?offset=1', status_code=500)
+
+        c = Client()
+        datasets = iter(c.list_datasets(items_per_page=1, prefetch=1))
+
+        assert next(datasets).id == 'a1b2c3'
+        with pytest.raises(HTTPException):
+            next(datasets)
+
+
+def test_datasets_pagination_parallel(dataset_data):
+    with requests_mock.mock() as m:
+        m.get(
+            'https://databasin.org/api/v1/datasets/?limit=1',
+            text=json.dumps({
+                'meta': {'next': '/api/v1/datasets/?limit=1&offset=1', 'total_count': 5},
+                'objects': [dict(dataset_data, id='a1b2c0')]
+            })
+        )
+        for i in range(1, 5):
+            page = {
+                'meta': {'next': None, 'total_count': 5},
+                'objects': [copy.copy(dataset_data)]
+            }
+            page['objects'][0]['id'] = 'a1b2c{}'.format(i)
+            m.get('https://databasin.org/api/v1/datasets/?offset={}'.format(i), text=json.dumps(page))
+
+        c = Client()
+        datasets = list(c.list_datasets(items_per_page=1, parallel=3))
+
+        assert m.call_count == 5
+        assert [d.id for d in datasets] == ['a1b2c0', 'a1b2c1', 'a1b2c2', 'a1b2c3', 'a1b2c4']
+        assert all(r.qs['limit'] == ['1'] for r in m.request_history)
+        assert sorted(r.qs.get('offset', ['0'])[0] for r in m.request_history) == ['0', '1', '2', '3', '4']
+
+        m.reset_mock()
+        datasets = list(c.list_datasets(items_per_page=1, parallel=3, ordered=False))
+
+        assert m.call_count == 5
+        assert datasets[0].id == 'a1b2c0'
+        assert sorted(d.id for d in datasets) == ['a1b2c0', 'a1b2c1', 'a1b2c2', 'a1b2c3', 'a1b2c4']
+
+
+def test_datasets_pagination_parallel_capped_limit(dataset_data):
+    ids = [str(i) for i in range(50)]
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', text=make_capped_pages_callback(dataset_data, 50, 10))
+
+        c = Client()
+        assert [d.id for d in c.list_datasets(items_per_page=20, parallel=4)] == ids
+        assert sorted(d.id for d in c.list_datasets(items_per_page=20, parallel=4, ordered=False)) == sorted(ids)
+
+
+def test_list_datasets_records(dataset_data):
+    with requests_mock.mock() as m:
+        data = {
+            'meta': {'next': '/api/v1/datasets/?limit=1&offset=1', 'total_count': 2},
+            'objects': [dataset_data]
+        }
+        m.get('https://databasin.org/api/v1/datasets/', text=json.dumps(data))
+        data = {
+            'meta': {'next': None, 'total_count': 2},
+            'objects': [dict(dataset_data, id='a1b2c4')]
+        }
+        m.get('https://databasin.org/api/v1/datasets/?offset=1', text=json.dumps(data))
+
+        c = Client()
+        datasets = list(c.list_datasets(items_per_page=1, records=True))
+
+        assert m.call_count == 2
+        assert [d.id for d in datasets] == ['a1b2c3', 'a1b2c4']
+        assert datasets[0].title == 'Some Dataset'
+        assert datasets[0].tags == ['one', 'two']
+        assert datasets[0].is_aggregate is False
+        assert datasets[0].thumbnail_url is None
+        assert not hasattr(datasets[0], '__dict__')
+
+
+def test_list_datasets_fields(dataset_data):
+    with requests_mock.mock() as m:
+        data = {
+            'meta': {'next': None, 'total_count': 1},
+            'objects': [{'id': 'a1b2c3', 'title': 'Some Dataset', 'modify_date': '2015-11-17T22:42:06+00:00'}]
+        }
+        m.get('https://databasin.org/api/v1/datasets/', text=json.dumps(data))
+
+        c = Client()
+        filters = {'private': False}
+        datasets = list(c.list_datasets(filters, fields=['title', 'modify_date']))
+
+        assert m.request_history[0].qs['fields'] == ['id,modify_date,title']
+        assert filters == {'private': False}
+        assert datasets[0].id == 'a1b2c3'
+        assert datasets[0].title == 'Some Dataset'
+        assert datasets[0]._url == 'https://databasin.org/api/v1/datasets/a1b2c3/'
+        with pytest.raises(AttributeError):
+            datasets[0].owner_id
+
+        records = list(c.list_datasets(fields=['title'], records=True))
+        assert records[0].as_dict() == {'id': 'a1b2c3', 'title': 'Some Dataset'}
+
+        with pytest.raises(ValueError):
+            c.list_datasets(fields=['foo'])
+
+
+def test_datasets_pagination_resume(dataset_data):
+    with requests_mock.mock() as m:
+        ids = ['a1b2c3', 'a1b2c4', 'a1b2c5', 'a1b2c6', 'a1b2c7']
+        pages = [
+            {
+                'meta': {
+                    'next': (
+                        '/api/v1/datasets/?private=False&limit=2&offset={}'.format(offset + 2) if offset < 4 else None
+                    ),
+                    'total_count': 5
+                },
+                'objects': [dict(dataset_data, id=i) for i in ids[offset:offset + 2]]
+            }
+            for offset in (0, 2, 4)
+        ]
+        m.get('https://databasin.org/api/v1/datasets/', text=json.dumps(pages[0]))
+        m.get('https://databasin.org/api/v1/datasets/?offset=2', text=json.dumps(pages[1]))
+        m.get('https://databasin.org/api/v1/datasets/?offset=4', text=json.dumps(pages[2]))
+
+        c = Client()
+        datasets = c.list_datasets({'private': False}, items_per_page=2)
+        seen = []
+        for dataset in datasets:
+            seen.append(dataset.id)
+            if len(seen) == 3:
+                break
+
+        cursor = json.loads(json.dumps(datasets.cursor))
+        assert cursor['index'] == 1
+        assert 'private=False' in cursor['url']
+
+        m.reset_mock()
+        datasets = c.list_datasets(resume_from=cursor)
+        seen += [d.id for d in datasets]
+
+        assert seen == ids
+        assert m.call_count == 2
+        assert m.request_history[0].qs == {'private': ['false'], 'limit': ['2'], 'offset': ['2']}
+
+
+def test_datasets_pagination_resume_prefetch(dataset_data):
+    def callback(request, context):
+        offset = int(request.qs.get('offset', ['0'])[0])
+        return json.dumps({
+            'meta': {
+                'next': '/api/v1/datasets/?limit=10&offset={}'.format(offset + 10) if offset < 40 else None,
+                'total_count': 50
+            },
+            'objects': [dict(dataset_data, id=str(i)) for i in range(offset, offset + 10)]
+        })
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', text=callback)
+
+        c = Client()
+        datasets = c.list_datasets(items_per_page=10, prefetch=2)
+        seen = []
+        for dataset in datasets:
+            seen.append(dataset.id)
+            if len(seen) == 15:
+                break
+
+        # Give the worker time to fetch ahead before taking the cursor
+        time.sleep(.1)
+        cursor = json.loads(json.dumps(datasets.cursor))
+
+        seen += [d.id for d in c.list_datasets(resume_from=cursor, prefetch=2)]
+
+        assert seen == [str(i) for i in range(50)]
+
+
+def test_datasets_pagination_random_access(dataset_data):
+    ids = ['a1b2c3', 'a1b2c4', 'a1b2c5', 'a1b2c6', 'a1b2c7']
+
+    with requests_mock.mock() as m:
+        for offset in (0, 2, 4):
+            m.get(
+                'https://databasin.org/api/v1/datasets/?offset={}'.format(offset),
+                text=json.dumps({
+                    'meta': {'next': None, 'total_count': 5},
+                    'objects': [dict(dataset_data, id=i) for i in ids[offset:offset + 2]]
+                })
+            )
+
+        c = Client()
+        datasets = c.list_datasets(filters={'offset': 0}, items_per_page=2)
+        assert m.call_count == 1
+
+        assert datasets[0].id == 'a1b2c3'
+        assert m.call_count == 1
+
+        assert datasets[3].id == 'a1b2c6'
+        assert m.call_count == 2
+        assert m.request_history[1].qs == {'limit': ['2'], 'offset': ['2']}
+
+        assert datasets[-1].id == 'a1b2c7'
+        assert [d.id for d in datasets[1:4]] == ids[1:4]
+        assert [d.id for d in datasets[::-2]] == ids[::-2]
+        assert datasets[5:] == []
+
+        with pytest.raises(IndexError):
+            datasets[5]
+
+        assert [d.id for d in datasets] == ids[:2]
+
+
+def test_datasets_pagination_random_access_capped_limit(dataset_data):
+    ids = [str(i) for i in range(50)]
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', text=make_capped_pages_callback(dataset_data, 50, 10))
+
+        c = Client()
+        datasets = c.list_datasets(items_per_page=20)
+
+        assert [d.id for d in datasets[12:18]] == ids[12:18]
+        assert [d.id for d in datasets[5:35]] == ids[5:35]
+        assert [d.id for d in datasets[::-7]] == ids[::-7]
+        assert datasets[45].id == '45'
+        assert datasets[-1].id == '49'
+
+        # Stepped slices fetch only the pages holding the requested indices
+        m.reset_mock()
+        assert [d.id for d in datasets[::20]] == ids[::20]
+        assert [d.id for d in datasets[-1::-20]] == ids[-1::-20]
+        assert m.call_count == 4
+
+    def short_pages_callback(request, context):
+        # Pages other than the first come back with fewer objects than requested
+        data = json.loads(callback(request, context))
+        if request.qs.get('offset', ['0']) != ['0']:
+            data['objects'] = data['objects'][:3]
+        return json.dumps(data)
+
+    callback = make_capped_pages_callback(dataset_data, 50, 10)
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', text=short_pages_callback)
+
+        c = Client()
+        datasets = c.list_datasets(items_per_page=10)
+
+        assert [d.id for d in datasets[8:25]] == ids[8:25]
+        assert datasets[33].id == '33'
+
+
 def test_datasets_with_filter():
     with requests_mock.mock() as m:
         data = {
@@ -357,6 +803,42 @@ def test_datasets_with_filter_with_api_key():
         assert m.request_history[0].qs['private'] == ['false']
 
 
+def test_count_datasets():
+    with requests_mock.mock() as m:
+        m.get(
+            'https://databasin.org/api/v1/datasets/',
+            text=json.dumps({'meta': {'next': None, 'total_count': 1234}, 'objects': [{'id': 'a1b2c3'}]})
+        )
+
+        c = Client()
+
+        assert c.count_datasets({'private': False}) == 1234
+        assert m.request_history[0].qs == {'private': ['false'], 'limit': ['1']}
+
+
+def test_count_datasets_login_required():
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', status_code=401)
+
+        c = Client()
+        with pytest.raises(LoginRequiredError):
+            c.count_datasets()
+
+
+def test_count_datasets_batch():
+    with requests_mock.mock() as m:
+        for owner, count in (('foo', 3), ('bar', 5), ('baz', 0)):
+            m.get(
+                'https://databasin.org/api/v1/datasets/?owner_id={}'.format(owner),
+                text=json.dumps({'meta': {'next': None, 'total_count': count}, 'objects': []})
+            )
+
+        c = Client()
+
+        assert c.count_datasets_batch([{'owner_id': 'foo'}, {'owner_id': 'bar'}, {'owner_id': 'baz'}]) == [3, 5, 0]
+        assert m.call_count == 3
+
+
 def test_my_datasets():
     with requests_mock.mock() as m:
         data = {
@@ -444,6 +926,17 @@ def test_get_dataset_import_forbidden():
             c.get_import('a1b2c3')
 
 
+def test_get_dataset_imports(dataset_import_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/dataset_imports/a1b2c3/', text=json.dumps(dataset_import_data))
+
+        c = Client()
+        results = c.get_imports(['a1b2c3'])
+
+        assert results[0].result.title == dataset_import_data['title']
+        assert results[0].error is None
+
+
 def test_list_dataset_imports(dataset_import_data):
     data = {
         'meta': {'next': None, 'total_count': 2},
@@ -527,6 +1020,33 @@ def test_list_dataset_imports_with_filters_with_api_key():
         assert m.request_history[0].qs == {'private': ['false']}
 
 
+def test_list_dataset_imports_records(dataset_import_data):
+    data = {'meta': {'next': None, 'total_count': 1}, 'objects': [dataset_import_data]}
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/dataset_imports/', text=json.dumps(data))
+
+        c = Client()
+        imports = list(c.list_imports(records=True))
+
+        assert [i.id for i in imports] == ['a1b2c3']
+        assert imports[0].failed is False
+        assert imports[0].aggregate_auto_updates is None
+
+
+def test_count_dataset_imports():
+    data = {'meta': {'next': None, 'total_count': 7}, 'objects': []}
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/dataset_imports/', text=json.dumps(data))
+
+        c = Client()
+
+        assert c.count_imports() == 7
+        assert c.count_imports_batch([{'private': False}, {'private': True}]) == [7, 7]
+        assert m.request_history[0].qs == {'limit': ['1']}
+
+
 def test_dataset_import_cancel(dataset_import_data):
     with requests_mock.mock() as m:
         m.get('https://databasin.org/api/v1/dataset_imports/a1b2c3/', text=json.dumps(dataset_import_data))
@@ -5,9 +5,12 @@ import json
 
 import pytest
 import requests_mock
+from requests.exceptions import ConnectionError, Timeout
+from restle.exceptions import HTTPException
 
 from databasin.client import Client
-from databasin.exceptions import LoginRequiredError, ForbiddenError
+from databasin.jobs import JobWatcher
+from databasin.exceptions import LoginRequiredError, ForbiddenError, JobTimeoutError
 from .utils import make_api_key_callback
 
 try:
@@ -119,6 +122,22 @@ def test_get_job_with_api_key(job_data):
         assert m.called
 
 
+def test_get_jobs(job_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', text=json.dumps(job_data))
+        m.get('https://databasin.org/api/v1/jobs/5678/', text=json.dumps(dict(job_data, id='5678')))
+        m.get('https://databasin.org/api/v1/jobs/9012/', status_code=401)
+
+        c = Client()
+        results = c.get_jobs(['5678', '9012', '1234'])
+
+        assert [r.id for r in results] == ['5678', '9012', '1234']
+        assert results[0].result.id == '5678'
+        assert results[2].result.id == '1234'
+        assert results[1].result is None
+        assert isinstance(results[1].error, LoginRequiredError)
+
+
 def test_job_refresh(job_data):
     job_data_2 = copy.copy(job_data)
     job_data_2.update({
@@ -239,3 +258,165 @@ def test_job_join(job_data):
             assert m.call_count == 4
             assert job.status == 'succeeded'
             assert time_mock.call_count == 3
+
+
+def test_job_watcher(job_data):
+    jobs = {str(i): dict(job_data, id=str(i)) for i in range(1, 4)}
+
+    def list_callback(request, context):
+        # Each poll, one more job completes
+        ids = request.qs['id__in'][0].split(',')
+        jobs[ids[0]]['status'] = 'succeeded'
+
+        return json.dumps({'meta': {'total_count': len(ids)}, 'objects': [jobs[id] for id in ids]})
+
+    with requests_mock.mock() as m:
+        for id, data in jobs.items():
+            m.get('https://databasin.org/api/v1/jobs/{0}/'.format(id), text=json.dumps(data))
+        m.get('https://databasin.org/api/v1/jobs/', text=list_callback)
+
+        c = Client()
+        completed = []
+
+        with JobWatcher(interval=.01) as watcher:
+            futures = [watcher.watch(c.get_job(id), callback=completed.append) for id in sorted(jobs)]
+            assert [f.result(5).status for f in futures] == ['succeeded'] * 3
+
+        assert sorted(job.id for job in completed) == ['1', '2', '3']
+        assert watcher.requests == 3
+
+
+def test_job_watcher_same_job(job_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', [
+            {'text': json.dumps(job_data)},
+            {'text': json.dumps(job_data)},
+            {'text': json.dumps(dict(job_data, status='succeeded', progress=100))}
+        ])
+        m.get('https://databasin.org/api/v1/jobs/', status_code=405)
+
+        c = Client()
+        a = c.get_job('1234')
+        b = c.get_job('1234')
+
+        with JobWatcher(interval=.01) as watcher:
+            fa = watcher.watch(a)
+            fb = watcher.watch(b)
+
+            assert fa.result(5) is a
+            assert fb.result(5) is b
+
+        assert (a.status, a.progress) == (b.status, b.progress) == ('succeeded', 100)
+
+
+def test_job_watcher_without_batch_support(job_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', [
+            {'text': json.dumps(job_data)},
+            {'text': json.dumps(dict(job_data, status='running'))},
+            {'text': json.dumps(dict(job_data, status='failed'))}
+        ])
+        m.get('https://databasin.org/api/v1/jobs/1235/', [
+            {'text': json.dumps(dict(job_data, id='1235'))},
+            {'status_code': 401}
+        ])
+        m.get('https://databasin.org/api/v1/jobs/', status_code=405)
+
+        c = Client()
+
+        with JobWatcher(interval=.01) as watcher:
+            future = watcher.watch(c.get_job('1234'))
+            failed = watcher.watch(c.get_job('1235'))
+
+            assert future.result(5).status == 'failed'
+            with pytest.raises(HTTPException):
+                failed.result(5)
+
+        assert not watcher.batch
+
+
+def test_job_watcher_transient_errors(job_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', [
+            {'text': json.dumps(job_data)},
+            {'exc': Timeout},
+            {'text': json.dumps(dict(job_data, status='succeeded'))}
+        ])
+        m.get('https://databasin.org/api/v1/jobs/', [
+            {'exc': ConnectionError},
+            {'status_code': 405}
+        ])
+
+        c = Client()
+
+        with JobWatcher(interval=.01) as watcher:
+            future = watcher.watch(c.get_job('1234'))
+            assert future.result(5).status == 'succeeded'
+
+        assert not watcher.batch
+        assert m.call_count == 5
+
+
+def test_job_watcher_failure(job_data):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', text=json.dumps(job_data))
+
+        c = Client()
+        watcher = JobWatcher(interval=.01)
+
+        with mock.patch.object(watcher, '_poll', side_effect=RuntimeError('Unexpected')):
+            future = watcher.watch(c.get_job('1234'))
+
+            with pytest.raises(RuntimeError):
+                future.result(5)
+
+        with pytest.raises(RuntimeError):
+            watcher.watch(c.get_job('1234'))
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    """Replaces `time.sleep` and `time.monotonic` in `databasin.jobs` with a fake clock, returning the sleeps"""
+
+    now = [1000.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr('databasin.jobs.time.sleep', sleep)
+    monkeypatch.setattr('databasin.jobs.time.monotonic', lambda: now[0])
+
+    return sleeps
+
+
+def test_job_join_timeout(job_data, clock):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', text=json.dumps(job_data))
+
+        job = Client().get_job('1234')
+        with pytest.raises(JobTimeoutError) as e:
+            job.join(timeout=2.5)
+
+        assert e.value.job is job
+        assert clock == [1, 1, .5]
+        assert m.call_count == 4
+
+
+def test_job_join_adaptive(job_data, clock):
+    progress = [0, 0, 0, 10, 20, 30, 40, 50, 60, 70, 80, 90]
+    responses = [{'text': json.dumps(dict(job_data, status='running', progress=p))} for p in progress]
+    responses.append({'text': json.dumps(dict(job_data, status='succeeded', progress=100))})
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/jobs/1234/', responses)
+
+        job = Client().get_job('1234')
+        job.join(poll='adaptive')
+
+        assert job.status == 'succeeded'
+
+        # Backs off until progress is made, then polls at half the estimated time remaining
+        assert clock[:3] == [.25, .375, .5625]
+        assert clock[4] > clock[3] and clock[-1] < clock[4]
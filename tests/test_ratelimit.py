@@ -0,0 +1,95 @@
+from __future__ import absolute_import
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from databasin.client import Client
+from databasin.ratelimit import RateLimiter, TokenBucket, get_endpoint_family, parse_retry_after
+from .utils import StubServer
+
+JOB_DATA = {'id': '1234', 'job_name': 'foo_job', 'status': 'queued', 'progress': 0, 'message': None}
+
+
+def test_endpoint_family():
+    assert get_endpoint_family('https://databasin.org/api/v1/jobs/1234/') == 'jobs'
+    assert get_endpoint_family('https://databasin.org/api/v1/datasets/?limit=1') == 'datasets'
+    assert get_endpoint_family('https://databasin.org/api/v1/dataset_imports/a1b2c3/') == 'imports'
+    assert get_endpoint_family('https://databasin.org/uploads/upload-temporary-file/') == 'uploads'
+    assert get_endpoint_family('https://databasin.org/auth/api/login/') == 'other'
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('2') == 2
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_token_bucket(monkeypatch):
+    now = [1000.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    monkeypatch.setattr('databasin.ratelimit.time.monotonic', lambda: now[0])
+    monkeypatch.setattr('databasin.ratelimit.time.sleep', sleep)
+
+    bucket = TokenBucket(rate=2, burst=2)
+    assert [bucket.acquire() for _ in range(4)] == [0, 0, .5, .5]
+    assert sleeps == [.5, .5]
+
+
+def test_throttled_request_retried():
+    responses = [
+        (429, {'Retry-After': '0.1'}, b''),
+        (503, {'Retry-After': '0'}, b''),
+        (200, {}, json.dumps(JOB_DATA))
+    ]
+
+    with StubServer(lambda request: responses.pop(0)) as server:
+        limiter = RateLimiter()
+        c = Client(rate_limiter=limiter)
+        c.base_url = server.url
+
+        start = time.time()
+        assert c.get_job('1234').id == '1234'
+        assert time.time() - start >= .1
+        assert len(server.requests) == 3
+        assert limiter.stats['throttled'] == 2
+
+
+def test_throttle_retries_limited():
+    with StubServer(lambda request: (429, {'Retry-After': '0'}, b'')) as server:
+        c = Client(rate_limiter=RateLimiter(max_retries=2))
+        c.base_url = server.url
+
+        assert c.get(c.build_url('/api/v1/jobs/1234/')).status_code == 429
+        assert len(server.requests) == 3
+
+
+def test_max_in_flight():
+    lock = threading.Lock()
+    in_flight = [0, 0]
+
+    def handler(request):
+        with lock:
+            in_flight[0] += 1
+            in_flight[1] = max(in_flight)
+        time.sleep(.02)
+        with lock:
+            in_flight[0] -= 1
+
+        return 200, {}, json.dumps(JOB_DATA)
+
+    with StubServer(handler) as server:
+        c = Client(rate_limiter=RateLimiter(max_in_flight=8, families={'jobs': {'max_in_flight': 2}}))
+        c.base_url = server.url
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda _: c.get_job('1234'), range(16)))
+
+        assert in_flight[1] <= 2
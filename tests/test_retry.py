@@ -0,0 +1,87 @@
+from __future__ import absolute_import
+
+import json
+import socket
+
+import pytest
+from requests.exceptions import ConnectionError
+
+from databasin.client import Client
+from databasin.retry import RetryPolicy
+from .utils import StubServer
+
+JOB_DATA = {'id': '1234', 'job_name': 'foo_job', 'status': 'queued', 'progress': 0, 'message': None}
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('databasin.retry.time.sleep', sleeps.append)
+    return sleeps
+
+
+def test_retry_transient_errors(no_sleep):
+    responses = [(502, {}, b''), (503, {'Retry-After': '2'}, b'')] + [(200, {}, json.dumps(JOB_DATA))] * 2
+
+    with StubServer(lambda request: responses.pop(0)) as server:
+        policy = RetryPolicy(backoff_factor=.1)
+        c = Client(retry_policy=policy)
+        c.base_url = server.url
+
+        job = c.get_job('1234')
+        job.refresh()
+
+        assert len(server.requests) == 4
+        assert policy.stats == {'requests': 2, 'retries': 2, 'exhausted': 0}
+        assert 0 <= no_sleep[0] <= .1
+        assert no_sleep[1] == 2
+
+
+def test_no_retry_for_post(no_sleep):
+    with StubServer(lambda request: (502, {}, b'')) as server:
+        c = Client(retry_policy=RetryPolicy())
+        c.base_url = server.url
+
+        assert c.post(c.build_url('/api/v1/jobs/'), data={}).status_code == 502
+        assert len(server.requests) == 1
+
+
+def test_retry_limit(no_sleep):
+    with StubServer(lambda request: (500, {}, b'')) as server:
+        c = Client(retry_policy=RetryPolicy(max_retries=2))
+        c.base_url = server.url
+
+        assert c.get(c.build_url('/api/v1/jobs/1234/')).status_code == 500
+        assert len(server.requests) == 3
+        assert len(no_sleep) == 2
+        assert all(delay <= .5 * 2 ** i for i, delay in enumerate(no_sleep))
+
+
+def test_retry_budget(no_sleep):
+    with StubServer(lambda request: (500, {}, b'')) as server:
+        policy = RetryPolicy(max_retries=3, budget=0, min_retries=4)
+        c = Client(retry_policy=policy)
+        c.base_url = server.url
+
+        for _ in range(3):
+            c.get(c.build_url('/api/v1/jobs/1234/'))
+
+        assert len(server.requests) == 7
+        assert policy.stats == {'requests': 3, 'retries': 4, 'exhausted': 2}
+
+
+def test_retry_connection_error(no_sleep):
+    # Find a port with nothing listening on it
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    policy = RetryPolicy(max_retries=2)
+    c = Client(retry_policy=policy)
+    c.base_url = 'http://127.0.0.1:{0}'.format(port)
+
+    with pytest.raises(ConnectionError):
+        c.get_job('1234')
+
+    assert policy.stats['retries'] == 2
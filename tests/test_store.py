@@ -0,0 +1,160 @@
+from __future__ import absolute_import
+
+import json
+import time
+
+import pytest
+import requests_mock
+import six
+
+from databasin.cache import TTLCache
+from databasin.client import Client
+from databasin.store import MetadataStore
+
+
+@pytest.fixture()
+def dataset_data():
+    return {
+        'id': 'a1b2c3',
+        'owner_id': 'user',
+        'private': False,
+        'title': 'Some Dataset',
+        'snippet': 'This dataset is...',
+        'create_date': '2015-11-17T22:42:06+00:00',
+        'modify_date': '2015-11-17T22:42:06+00:00',
+        'native': True,
+        'tags': ['one', 'two'],
+        'credits': None
+    }
+
+
+@pytest.fixture()
+def store_path(tmp_path):
+    return str(tmp_path / 'metadata.sqlite3')
+
+
+def test_store_put_get(dataset_data, store_path):
+    store = MetadataStore(store_path)
+    store.put('datasets', dataset_data)
+
+    payload, fetched_at = MetadataStore(store_path).get('datasets', 'a1b2c3')
+    assert payload == dataset_data
+    assert not store.is_stale(fetched_at)
+    assert store.count('datasets') == 1
+
+    store.delete('datasets', 'a1b2c3')
+    assert store.get('datasets', 'a1b2c3') is None
+
+
+def test_store_keeps_newer_copy(dataset_data, store_path):
+    store = MetadataStore(store_path)
+    store.put('datasets', dict(dataset_data, title='New', modify_date='2016-01-01T00:00:00+00:00'))
+    store.put('datasets', dataset_data)
+
+    assert store.get('datasets', 'a1b2c3')[0]['title'] == 'New'
+
+
+def test_get_dataset_from_store(dataset_data, store_path):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dataset_data))
+
+        Client(store=MetadataStore(store_path)).get_dataset('a1b2c3')
+        assert m.call_count == 1
+
+        # A new client (e.g., in another process) starts with the stored metadata
+        dataset = Client(store=MetadataStore(store_path)).get_dataset('a1b2c3')
+        assert m.call_count == 1
+        assert dataset.title == 'Some Dataset'
+        assert dataset.tags == ['one', 'two']
+
+
+def test_list_datasets_saved_to_store(dataset_data, store_path):
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', text=json.dumps({
+            'meta': {'next': None, 'total_count': 1},
+            'objects': [dataset_data]
+        }))
+
+        store = MetadataStore(store_path)
+        list(Client(store=store).list_datasets())
+
+        assert store.get('datasets', 'a1b2c3')[0]['title'] == 'Some Dataset'
+
+
+def test_stale_dataset_revalidated(dataset_data, store_path):
+    store = MetadataStore(store_path, max_age=0)
+    store.put('datasets', dataset_data)
+    time.sleep(.01)
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dict(dataset_data, title='Updated')))
+
+        c = Client(store=store)
+        assert c.get_dataset('a1b2c3').title == 'Some Dataset'
+
+        c._background.shutdown(wait=True)
+        assert m.call_count == 1
+        assert store.get('datasets', 'a1b2c3')[0]['title'] == 'Updated'
+
+
+def test_stale_dataset_not_cached(dataset_data, store_path):
+    store = MetadataStore(store_path, max_age=0)
+    store.put('datasets', dataset_data)
+    time.sleep(.01)
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/a1b2c3/', text=json.dumps(dict(dataset_data, title='Updated')))
+
+        c = Client(store=store, dataset_cache=TTLCache())
+        assert c.get_dataset('a1b2c3').title == 'Some Dataset'
+        assert c.dataset_cache.get('a1b2c3') is None
+
+        c._background.shutdown(wait=True)
+        assert c.dataset_cache.get('a1b2c3') is None
+        assert store.get('datasets', 'a1b2c3')[0]['title'] == 'Updated'
+
+
+def make_sync_callback(datasets):
+    """Serves `datasets` like the dataset list endpoint, supporting the filters and ordering used by sync"""
+
+    def callback(request, context):
+        qs = six.moves.urllib_parse.parse_qs(six.moves.urllib_parse.urlparse(request.url).query)
+        objects = sorted(datasets, key=lambda x: (x['modify_date'], x['id']))
+        if 'modify_date__gt' in qs:
+            objects = [x for x in objects if x['modify_date'] > qs['modify_date__gt'][0]]
+        if 'modify_date__gte' in qs:
+            objects = [x for x in objects if x['modify_date'] >= qs['modify_date__gte'][0]]
+
+        offset = int(qs.get('offset', [0])[0])
+        limit = int(qs['limit'][0])
+        return json.dumps({
+            'meta': {'total_count': len(objects), 'offset': offset, 'limit': limit},
+            'objects': objects[offset:offset + limit]
+        })
+
+    return callback
+
+
+def test_sync_datasets(dataset_data, store_path):
+    # Three datasets share a modify_date, straddling a page boundary
+    datasets = [
+        dict(dataset_data, id=str(i), modify_date='2015-11-{0:02d}T00:00:00+00:00'.format(min(i, 3) + 10))
+        for i in range(5)
+    ]
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/datasets/', text=make_sync_callback(datasets))
+
+        store = MetadataStore(store_path)
+        c = Client()
+        assert c.sync_datasets(store, items_per_page=2) == 5
+        assert store.count('datasets') == 5
+        assert store.get_state('datasets.modify_date') == '2015-11-13T00:00:00+00:00'
+
+        assert c.sync_datasets(store, items_per_page=2) == 0
+
+        datasets[0]['modify_date'] = '2015-12-01T00:00:00+00:00'
+        datasets[0]['title'] = 'Updated'
+        assert c.sync_datasets(store, items_per_page=2) == 1
+        assert store.get('datasets', '0')[0]['title'] == 'Updated'
+        assert 'modify_date__gt' in m.last_request.qs
@@ -202,3 +202,31 @@ def test_list_temporary_files_with_api_key(tmp_file_data):
         tmp_files = list(tmp_files)
         assert tmp_files[0].uuid == '1234'
         assert tmp_files[1].uuid == '1235'
+
+
+def test_list_temporary_files_records(tmp_file_data):
+    data = {
+        'meta': {'next': None, 'total_count': 1},
+        'objects': [tmp_file_data]
+    }
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/uploads/temporary-files/', text=json.dumps(data))
+
+        c = Client()
+        tmp_files = list(c.list_temporary_files(records=True))
+
+        assert len(tmp_files) == 1
+        assert tmp_files[0].uuid == '1234'
+        assert tmp_files[0].as_dict() == tmp_file_data
+
+
+def test_count_temporary_files():
+    data = {'meta': {'next': None, 'total_count': 3}, 'objects': []}
+
+    with requests_mock.mock() as m:
+        m.get('https://databasin.org/api/v1/uploads/temporary-files/?limit=1', text=json.dumps(data))
+
+        c = Client()
+
+        assert c.count_temporary_files() == 3
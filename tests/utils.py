@@ -1,36 +1,115 @@
 import datetime
+import threading
 
 import dateutil.parser
+import six
 from dateutil.tz import tzlocal
 from django.core.signing import base64_hmac
 from django.utils.crypto import constant_time_compare
 
 
-def make_api_key_callback(response, key):
-    class AuthenticationError(Exception):
-        pass
+class AuthenticationError(Exception):
+    pass
 
-    def callback(request, context):
-        if not all(h in request.headers for h in ('x-api-user', 'x-api-time', 'x-api-signature')):
-            context.status_code = 401
-            raise AuthenticationError('API headers are missing')
 
-        request_time = dateutil.parser.parse(request.headers['x-api-time'])
-        if request_time > datetime.datetime.now(tzlocal()) + datetime.timedelta(minutes=5):
-            raise AuthenticationError('API request date is too old')
+def verify_api_key_headers(headers, key):
+    """Raises `AuthenticationError` unless `headers` carry a valid API key signature for `key`"""
 
-        try:
-            salt, signature = request.headers['x-api-signature'].split(b':', 1)
-            signature = signature.strip(b'=')
-        except ValueError:
-            raise AuthenticationError('API signature is malformed')
+    if not all(h in headers for h in ('x-api-user', 'x-api-time', 'x-api-signature')):
+        raise AuthenticationError('API headers are missing')
 
-        test_signature = base64_hmac(salt, request.headers['x-api-time'], key)
-        if constant_time_compare(test_signature, signature):
-            context.status_code = 200
-            return response
+    request_time = dateutil.parser.parse(headers['x-api-time'])
+    if request_time > datetime.datetime.now(tzlocal()) + datetime.timedelta(minutes=5):
+        raise AuthenticationError('API request date is too old')
 
-        context.status_code = 401
+    signature_header = headers['x-api-signature']
+    if not isinstance(signature_header, bytes):
+        signature_header = signature_header.encode()
+
+    try:
+        salt, signature = signature_header.split(b':', 1)
+        signature = signature.strip(b'=')
+    except ValueError:
+        raise AuthenticationError('API signature is malformed')
+
+    test_signature = base64_hmac(salt, headers['x-api-time'], key)
+    if not constant_time_compare(test_signature, signature):
         raise AuthenticationError('Key signature is bad ({} != {})'.format(signature, test_signature))
 
+
+def make_api_key_callback(response, key):
+    def callback(request, context):
+        try:
+            verify_api_key_headers(request.headers, key)
+        except AuthenticationError:
+            context.status_code = 401
+            raise
+
+        context.status_code = 200
+        return response
+
     return callback
+
+
+class StubRequest(object):
+    def __init__(self, method, path, headers, body):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+
+class StubServer(object):
+    """
+    A local HTTP server for tests that need to exercise the client's transport adapters, which `requests_mock`
+    replaces. `handler` is called with a `StubRequest` for each request and returns `(status, headers, body)`.
+    """
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.requests = []
+
+        server = self
+
+        class RequestHandler(six.moves.BaseHTTPServer.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def handle_request(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                request = StubRequest(self.command, self.path, self.headers, self.rfile.read(length))
+                server.requests.append(request)
+
+                status, headers, body = server.handler(request)
+                if not isinstance(body, bytes):
+                    body = body.encode()
+
+                self.send_response(status)
+                for name, value in six.iteritems(headers):
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                if self.close_connection:
+                    self.send_header('Connection', 'close')
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = handle_request
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = six.moves.socketserver.ThreadingTCPServer(('127.0.0.1', 0), RequestHandler)
+        self._server.daemon_threads = True
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}'.format(self._server.server_address[1])
+
+    def __enter__(self):
+        thread = threading.Thread(target=self._server.serve_forever, args=(.05,))
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._server.shutdown()
+        self._server.server_close()